@@ -1,12 +1,24 @@
-from flask import Flask, request, redirect, url_for
+from flask import Flask, Response, request, redirect, url_for
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-import random
 import json
 import joblib
-import csv
-import datetime
-from werkzeug.security import check_password_hash, generate_password_hash
+import gc
+import hashlib
+import hmac
+import io
+import threading
+import time
+from datetime import datetime, timezone
+import numpy as np
+from markupsafe import escape
+from werkzeug.http import http_date, is_resource_modified, quote_etag
 import os
+from prediction_cache import PredictionCache, feature_vector_key
+from prediction_log import PredictionLogger
+from flat_forest import load_flat_forest
+from people import PeopleDataset, SORTABLE_FIELDS, generate_people
+from user_store import UserStore
+from auth_pool import AuthPoolBusy, PasswordHashPool
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key')
@@ -14,9 +26,23 @@ app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key')
 login_manager = LoginManager()
 login_manager.init_app(app)
 
-# Load hashed user store from users.json
-with open('users.json', 'r', encoding='utf-8') as f:
-    USERS = json.load(f)
+# Hashed passwords in SQLite (WAL), shared by all workers; the accounts in users.json are migrated in once
+USER_STORE = UserStore(os.environ.get('USER_DB_PATH', 'users.db'), legacy_json_path='users.json')
+
+# Password hashing/verification runs on a small bounded pool (see auth_pool.py) so a burst of logins
+# can't hold every request thread; beyond AUTH_HASH_WORKERS + AUTH_HASH_QUEUE calls the request gets a 503
+AUTH_POOL = PasswordHashPool(
+    workers=int(os.environ.get('AUTH_HASH_WORKERS', '2')),
+    max_pending=int(os.environ.get('AUTH_HASH_QUEUE', '8')),
+    timeout=float(os.environ.get('AUTH_HASH_TIMEOUT', '5')),
+    retry_after=int(os.environ.get('AUTH_RETRY_AFTER', '1')),
+)
+
+
+@app.errorhandler(AuthPoolBusy)
+def auth_pool_busy(exc):
+    return ("Too many sign-in requests right now, please try again shortly.", 503,
+            {'Retry-After': str(exc.retry_after)})
 
 class User(UserMixin):
         def __init__(self, id):
@@ -24,51 +50,353 @@ class User(UserMixin):
 
 @login_manager.user_loader
 def load_user(user_id):
-        if user_id in USERS:
+        if USER_STORE.exists(user_id):
                 return User(user_id)
         return None
 
-NATIONALITIES = ['USA','UK','Canada','Nigeria','Kenya','India','China']
-RACES = ['Asian','Black','White','Hispanic','Other']
-SEXES = ['M','F']
-GRADE_BUCKETS = ['A','B','C','D','F']
-
-def generate_people(n=25):
-        people = []
-        for i in range(n):
-                people.append({
-                        'name': f'Person {i+1}',
-                        'age': random.randint(10,80),
-                        'grade': random.choice(GRADE_BUCKETS),
-                        'sex': random.choice(SEXES),
-                        'nationality': random.choice(NATIONALITIES),
-                        'race': random.choice(RACES)
-                })
-        return people
-
-
-# Lazy-loaded model bundle (dict with 'pipeline' and 'label_map')
+MAX_PAGE_SIZE = 500
+
+# People shown on the index page: generated once per process with a fixed seed, so every gunicorn
+# worker serves the same rows and paging through /api/people stays consistent. PeopleDataset
+# precomputes a sorted index per field, so a sorted page is a slice rather than a full sort.
+PEOPLE = PeopleDataset(generate_people(int(os.environ.get('PEOPLE_COUNT', '25')), seed=int(os.environ.get('PEOPLE_SEED', '42'))))
+
+
+MODEL_PATH = os.environ.get('MODEL_PATH', 'model.pkl')
+# seconds between checks of model.pkl for a newer artifact on the request path (0 disables hot reload)
+MODEL_RELOAD_INTERVAL = float(os.environ.get('MODEL_RELOAD_INTERVAL', '5'))
+# directory written by `flat_forest.py export`; used instead of sklearn when its model version matches (empty = off)
+FLAT_MODEL_DIR = os.environ.get('FLAT_MODEL_DIR', '')
+# bearer token for POST /admin/reload-model (empty = endpoint disabled)
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+# Lazy-loaded model bundle (dict with 'pipeline' and 'label_map', see prepare_model_bundle).
+# Replaced wholesale on reload: requests keep the bundle they started with.
 _MODEL_BUNDLE = None
+_MODEL_LOCK = threading.Lock()
+_RELOAD_STATE = {'checked_at': 0.0, 'in_progress': False, 'failed_signature': None, 'last_error': None}
+
+
 def load_model_bundle():
     global _MODEL_BUNDLE
     if _MODEL_BUNDLE is None:
-        try:
-            _MODEL_BUNDLE = joblib.load('model.pkl')
-        except Exception:
-            _MODEL_BUNDLE = None
+        with _MODEL_LOCK:
+            if _MODEL_BUNDLE is None:
+                try:
+                    _MODEL_BUNDLE = read_model_bundle()
+                except Exception:
+                    _MODEL_BUNDLE = None
+    elif MODEL_RELOAD_INTERVAL > 0:
+        _maybe_start_reload()
     return _MODEL_BUNDLE
 
 
-def log_prediction(user, pred, features):
-    # append a CSV row with timestamp, user, prediction, and JSON-encoded features
-    row = [datetime.datetime.utcnow().isoformat() + 'Z', user or '', str(pred), json.dumps(features, ensure_ascii=False)]
+def _model_file_signature(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def read_model_bundle(path=None):
+    """Load a model artifact into a prepared bundle tagged with 'version' (content hash) and 'signature' (mtime, size)."""
+    path = path or MODEL_PATH
+    signature = _model_file_signature(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    bundle = prepare_model_bundle(joblib.load(io.BytesIO(data)))
+    bundle['version'] = hashlib.sha256(data).hexdigest()[:12]
+    bundle['signature'] = signature
+    bundle['flat'] = _load_flat_model(bundle)
+    return bundle
+
+
+def _load_flat_model(bundle):
+    # the flat evaluator is only trusted for the exact model.pkl it was exported (and verified) from
+    if not FLAT_MODEL_DIR or bundle['feature_names'] is None:
+        return None
     try:
-        with open('prediction_logs.csv', 'a', encoding='utf-8', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(row)
+        flat = load_flat_forest(FLAT_MODEL_DIR, bundle['version'])
+    except Exception as e:
+        print(f'Ignoring flat model in {FLAT_MODEL_DIR}: {e}', flush=True)
+        return None
+    if flat is None or flat.feature_names != bundle['feature_names']:
+        print(f"No flat model for version {bundle['version']} in {FLAT_MODEL_DIR}; using sklearn", flush=True)
+        return None
+    return flat
+
+
+def _maybe_start_reload():
+    # cheap stat() at most every MODEL_RELOAD_INTERVAL seconds; the load itself runs in a background thread
+    state = _RELOAD_STATE
+    now = time.monotonic()
+    if state['in_progress'] or now - state['checked_at'] < MODEL_RELOAD_INTERVAL:
+        return
+    state['checked_at'] = now
+    try:
+        signature = _model_file_signature(MODEL_PATH)
+    except OSError:
+        return
+    if signature == _MODEL_BUNDLE['signature'] or signature == state['failed_signature']:
+        return
+    with _MODEL_LOCK:
+        if state['in_progress']:
+            return
+        state['in_progress'] = True
+    threading.Thread(target=reload_model_bundle, name='model-reload', daemon=True).start()
+
+
+def reload_model_bundle():
+    """Load model.pkl again, warm it, and swap it in as the active bundle.
+
+    Returns the new bundle, or None if loading failed (the current model stays active).
+    """
+    global _MODEL_BUNDLE
+    state = _RELOAD_STATE
+    try:
+        bundle = read_model_bundle()
+        warm_model_bundle(bundle)
+        # a single reference assignment: readers see either the old or the new bundle, never a partial one
+        _MODEL_BUNDLE = bundle
+        if PREDICTION_CACHE is not None:
+            # old-version entries can never hit again; free their memory
+            PREDICTION_CACHE.clear()
+        state['last_error'] = None
+        print(f"Loaded model version {bundle['version']} from {MODEL_PATH}", flush=True)
+        return bundle
+    except Exception as e:
+        # don't retry the same broken file on every check; a newer write gets a new signature
+        try:
+            state['failed_signature'] = _model_file_signature(MODEL_PATH)
+        except OSError:
+            pass
+        state['last_error'] = str(e)
+        print(f'Model reload failed, keeping the current model: {e}', flush=True)
+        return None
+    finally:
+        state['in_progress'] = False
+
+
+def current_model_version():
+    bundle = _MODEL_BUNDLE
+    return bundle['version'] if bundle is not None else None
+
+
+def current_model_engine():
+    bundle = _MODEL_BUNDLE
+    if bundle is None:
+        return None
+    return 'flat' if bundle.get('flat') is not None else 'sklearn'
+
+
+def _resident_memory_mb():
+    # current RSS from /proc on Linux, else peak RSS from getrusage; None where neither exists
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
     except Exception:
-        # best-effort logging; don't fail prediction for IO errors
         pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except Exception:
+        return None
+
+
+def warm_model_bundle(bundle):
+    # one dummy prediction pulls in the sklearn predict code paths before the first real request
+    if bundle['feature_names'] is None:
+        return 0.0
+    start = time.perf_counter()
+    predict_records(bundle, [dict.fromkeys(bundle['feature_names'], 0.0)])
+    return time.perf_counter() - start
+
+
+def preload_model():
+    """Load and warm the model bundle at import time (PRELOAD_MODEL=1, set by gunicorn.conf.py).
+
+    With gunicorn's preload_app the master runs this before forking, so workers inherit the
+    unpickled forest copy-on-write instead of each paying the load on their first /predict.
+    """
+    start = time.perf_counter()
+    bundle = load_model_bundle()
+    load_seconds = time.perf_counter() - start
+    if bundle is None:
+        print(f'Model preload failed: {MODEL_PATH} could not be loaded', flush=True)
+        return None
+    warm_seconds = warm_model_bundle(bundle)
+    # move everything allocated so far out of the GC's reach; collections in the workers would
+    # otherwise write to the shared pages and defeat copy-on-write
+    gc.collect()
+    gc.freeze()
+    rss = _resident_memory_mb()
+    rss_text = f'{rss:.1f} MB' if rss is not None else 'unknown'
+    print(f'Preloaded model {bundle["version"]} in {load_seconds:.3f}s (warm-up predict {warm_seconds:.3f}s), resident memory {rss_text}', flush=True)
+    return bundle
+
+
+def prepare_model_bundle(raw):
+    """Normalize a loaded model.pkl into a dict holding everything /predict needs per request.
+
+    Adds the training feature order ('feature_names', saved by train_priority_model.py or read from
+    the fitted pipeline's feature_names_in_), the inverse label map, and the fitted scaler arrays used
+    by the NumPy fast path.
+    """
+    pipe = raw.get('pipeline') if isinstance(raw, dict) else raw
+    label_map = raw.get('label_map') if isinstance(raw, dict) else None
+    feature_names = raw.get('feature_names') if isinstance(raw, dict) else None
+    if feature_names is None:
+        feature_names = getattr(pipe, 'feature_names_in_', None)
+    feature_names = [str(n) for n in feature_names] if feature_names is not None else None
+    return {
+        'pipeline': pipe,
+        'label_map': label_map,
+        'inv_label_map': {v:k for k,v in label_map.items()} if label_map else None,
+        'feature_names': feature_names,
+        'fast_path': _fast_path_steps(pipe) if feature_names is not None else None,
+        'flat': None,
+    }
+
+
+def _fast_path_steps(pipe):
+    # (mean, scale, estimator) for a StandardScaler + estimator pipeline, else None (use the DataFrame path)
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+    if not isinstance(pipe, Pipeline) or len(pipe.steps) != 2:
+        return None
+    scaler, estimator = pipe.steps[0][1], pipe.steps[1][1]
+    if not isinstance(scaler, StandardScaler):
+        return None
+    mean = scaler.mean_ if scaler.with_mean else None
+    scale = scaler.scale_ if scaler.with_std else None
+    return (mean, scale, estimator)
+
+
+def describe_feature_mismatch(features, feature_names):
+    missing = [n for n in feature_names if n not in features]
+    known = set(feature_names)
+    extra = [k for k in features if k not in known]
+    parts = []
+    if missing:
+        parts.append(f"missing features: {missing}")
+    if extra:
+        parts.append(f"unexpected features: {extra}")
+    return '; '.join(parts) or 'features do not match the training features'
+
+
+def fill_feature_row(features, feature_names, out):
+    """Copy a feature dict into the float64 row `out` in training order.
+    Raises ValueError naming any missing, extra, non-numeric or non-finite (null, NaN, Infinity) features.
+    """
+    if not isinstance(features, dict):
+        raise ValueError('features must be a JSON object')
+    if len(features) != len(feature_names):
+        raise ValueError(describe_feature_mismatch(features, feature_names))
+    for i, name in enumerate(feature_names):
+        try:
+            out[i] = features[name]
+        except KeyError:
+            raise ValueError(describe_feature_mismatch(features, feature_names)) from None
+        except (TypeError, ValueError):
+            raise ValueError(f"feature {name!r} must be a number, got {features[name]!r}") from None
+    # null becomes NaN on assignment; reject it and NaN/Infinity so every engine sees the same finite input
+    if not np.isfinite(out).all():
+        name = feature_names[int(np.flatnonzero(~np.isfinite(out))[0])]
+        raise ValueError(f"feature {name!r} must be a number, got {features[name]!r}")
+
+
+def features_to_matrix(records, feature_names):
+    # preallocated (n_records, n_features) float64 matrix in training feature order
+    X = np.empty((len(records), len(feature_names)), dtype=np.float64)
+    for r, features in enumerate(records):
+        try:
+            fill_feature_row(features, feature_names, X[r])
+        except ValueError as e:
+            if len(records) == 1:
+                raise
+            # name the offending record so a client can find it in a large batch
+            raise ValueError(f'record {r}: {e}') from None
+    return X
+
+
+def predict_records(bundle, records, cache=None):
+    """Return predicted labels for a list of feature dicts, in input order.
+    With a PredictionCache, rows already scored by this model version skip the model entirely.
+    """
+    feature_names = bundle['feature_names']
+    if feature_names is None:
+        # unknown training order: let pandas align columns by name
+        import pandas as _pd
+        return _decode_predictions(bundle, bundle['pipeline'].predict(_pd.DataFrame.from_records(records)))
+    X = features_to_matrix(records, feature_names)
+    if cache is None:
+        return predict_matrix(bundle, X)
+    version = bundle.get('version')
+    keys = [feature_vector_key(version, row) for row in X]
+    labels = [cache.get(key) for key in keys]
+    missing = [i for i, label in enumerate(labels) if label is None]
+    if missing:
+        for i, label in zip(missing, predict_matrix(bundle, X[missing])):
+            labels[i] = label
+            cache.put(keys[i], label)
+    return labels
+
+
+def predict_matrix(bundle, X):
+    """Predict labels for a float64 matrix whose columns are in training order (X may be modified)."""
+    fast = bundle['fast_path']
+    if bundle.get('flat') is not None:
+        # exported arrays with the scaler folded into the thresholds: raw features, same labels as sklearn
+        preds_enc = bundle['flat'].predict(X)
+    elif fast is None:
+        import pandas as _pd
+        preds_enc = bundle['pipeline'].predict(_pd.DataFrame(X, columns=bundle['feature_names']))
+    else:
+        # same arithmetic as StandardScaler.transform, without DataFrame/column validation
+        mean, scale, estimator = fast
+        if mean is not None:
+            X -= mean
+        if scale is not None:
+            X /= scale
+        preds_enc = estimator.predict(X)
+    return _decode_predictions(bundle, preds_enc)
+
+
+def _decode_predictions(bundle, preds_enc):
+    inv_label_map = bundle['inv_label_map']
+    if inv_label_map is not None:
+        return [inv_label_map[int(p)] for p in preds_enc]
+    return [str(p) for p in preds_enc]
+
+
+# Opt-in LRU cache of predictions (PREDICTION_CACHE_SIZE entries, 0 = off); keys include the model version
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', '0'))
+PREDICTION_CACHE = PredictionCache(
+    max_entries=PREDICTION_CACHE_SIZE,
+    max_bytes=int(os.environ.get('PREDICTION_CACHE_MAX_BYTES', str(16 * 1024 * 1024))),
+) if PREDICTION_CACHE_SIZE > 0 else None
+
+
+# Predictions are queued and written in batches by a background thread (see prediction_log.py)
+# PREDICTION_LOG_FORMAT=columnar writes memory-mappable NumPy segments into a directory instead
+PREDICTION_LOG_FORMAT = os.environ.get('PREDICTION_LOG_FORMAT', 'csv')
+PREDICTION_LOGGER = PredictionLogger(
+    os.environ.get('PREDICTION_LOG_PATH', 'prediction_logs' if PREDICTION_LOG_FORMAT == 'columnar' else 'prediction_logs.csv'),
+    batch_size=int(os.environ.get('PREDICTION_LOG_BATCH', '500')),
+    flush_interval=float(os.environ.get('PREDICTION_LOG_FLUSH_SECONDS', '1.0')),
+    format=PREDICTION_LOG_FORMAT,
+    dtype=os.environ.get('PREDICTION_LOG_DTYPE', 'float64'),
+    segment_rows=int(os.environ.get('PREDICTION_LOG_SEGMENT_ROWS', '10000')),
+    segment_seconds=float(os.environ.get('PREDICTION_LOG_SEGMENT_SECONDS', '300')),
+)
+
+
+def log_prediction(user, pred, features):
+    # queue a CSV row with timestamp, user, prediction, and JSON-encoded features
+    log_predictions(user, [pred], [features])
+
+
+def log_predictions(user, preds, features_list):
+    # non-blocking: failures show up as dropped records in PREDICTION_LOGGER.stats()
+    PREDICTION_LOGGER.log(user, preds, features_list)
 
 BASE_HTML = """
 <!doctype html>
@@ -140,10 +468,16 @@ INDEX_CONTENT = """
         <tbody>
         </tbody>
     </table>
+    <div class="filter-row" style="justify-content:flex-end;margin-top:12px">
+        <span id="pageInfo"></span>
+        <button id="prev" class="btn secondary">Previous</button>
+        <button id="next" class="btn secondary">Next</button>
+    </div>
 </section>
 
 <script>
-const data = {people_json};
+const PAGE_SIZE = 25;
+const state = {sort: '', order: 'asc', offset: 0, total: 0};
 const tableBody = document.querySelector('#dataTable tbody');
 function render(arr){
     tableBody.innerHTML = '';
@@ -153,21 +487,32 @@ function render(arr){
         tableBody.appendChild(tr);
     }
 }
-render(data);
+async function load(){
+    // the server sorts and slices; only the requested page is transferred
+    const params = new URLSearchParams({order: state.order, offset: state.offset, limit: PAGE_SIZE});
+    if(state.sort) params.set('sort', state.sort);
+    const resp = await fetch('/api/people?' + params.toString());
+    const page = await resp.json();
+    state.total = page.total;
+    render(page.items);
+    const last = Math.min(state.offset + page.items.length, page.total);
+    document.getElementById('pageInfo').textContent = page.total ? `${state.offset + 1}-${last} of ${page.total}` : 'No records';
+    document.getElementById('prev').disabled = state.offset === 0;
+    document.getElementById('next').disabled = last >= page.total;
+}
 document.getElementById('apply').addEventListener('click', ()=>{
-    const field = document.getElementById('sortField').value;
-    const order = document.getElementById('order').value;
-    const sorted = [...data].sort((a,b)=>{
-        const av = a[field]; const bv = b[field];
-        if(av == null) return 1; if(bv == null) return -1;
-        if(typeof av === 'string'){
-            return order==='asc' ? av.localeCompare(bv) : bv.localeCompare(av);
-        }
-        return order==='asc' ? (av - bv) : (bv - av);
-    });
-    render(sorted);
+    state.sort = document.getElementById('sortField').value;
+    state.order = document.getElementById('order').value;
+    state.offset = 0;
+    load();
 });
-document.getElementById('refresh').addEventListener('click', ()=>render(data));
+document.getElementById('refresh').addEventListener('click', ()=>{
+    state.sort = ''; state.order = 'asc'; state.offset = 0;
+    load();
+});
+document.getElementById('prev').addEventListener('click', ()=>{ state.offset = Math.max(0, state.offset - PAGE_SIZE); load(); });
+document.getElementById('next').addEventListener('click', ()=>{ state.offset += PAGE_SIZE; load(); });
+load();
 </script>
 """
 
@@ -196,37 +541,136 @@ LOGOUT_FORM = """
 </form>
 """
 
+SIGNUP_LINK_HTML = '<a href="/register" class="btn secondary">Sign up</a>'
+ANONYMOUS_AUTH_HTML = f"{LOGIN_FORM} {SIGNUP_LINK_HTML}"
+
+
+def _split_base_html(template):
+    # the static text around __AUTH_HTML__, __MESSAGE_HTML__ and __CONTENT_HTML__, split once at import
+    parts = []
+    rest = template
+    for marker in ('__AUTH_HTML__', '__MESSAGE_HTML__', '__CONTENT_HTML__'):
+        head, found, rest = rest.partition(marker)
+        if not found:
+            raise ValueError(f'BASE_HTML is missing {marker}')
+        parts.append(head)
+    parts.append(rest)
+    return tuple(parts)
+
+
+_PAGE_PARTS = _split_base_html(BASE_HTML)
+
+
+def render_page(auth_html, message_html, content_html):
+    """BASE_HTML with the three slots filled, assembled with a single join."""
+    p0, p1, p2, p3 = _PAGE_PARTS
+    return ''.join((p0, auth_html, p1, message_html, p2, content_html, p3))
+
+
+def notice_html(msg):
+    return f'<div class="notice">{escape(msg)}</div>' if msg else ''
+
+
+def _static_page(auth_html, content_html):
+    body = render_page(auth_html, '', content_html).encode('utf-8')
+    etag = hashlib.sha256(body).hexdigest()[:16]
+    quoted_etag = quote_etag(etag)
+    headers = [
+        ('Content-Type', 'text/html; charset=utf-8'),
+        ('ETag', quoted_etag),
+        ('Last-Modified', http_date(PAGES_BUILT_AT)),
+        # revalidate every time: the same URL renders differently once logged in
+        ('Cache-Control', 'no-cache'),
+        ('Vary', 'Cookie'),
+    ]
+    return {'body': body, 'etag': etag, 'quoted_etag': quoted_etag, 'headers': headers,
+            'not_modified_headers': [h for h in headers if h[0] != 'Content-Type']}
+
+
+# pages without per-request parts, rendered, hashed and given their headers once; browsers revalidate them with
+# If-None-Match/If-Modified-Since and get an empty 304 instead of the page
+PAGES_BUILT_AT = datetime.now(timezone.utc).replace(microsecond=0)
+STATIC_PAGES = {
+    'index': _static_page(ANONYMOUS_AUTH_HTML, INDEX_CONTENT),
+    'login': _static_page(SIGNUP_LINK_HTML, LOGIN_FORM),
+    'register': _static_page(LOGIN_FORM, REGISTER_FORM),
+}
+
+
+def serve_static_page(name):
+    page = STATIC_PAGES[name]
+    environ = request.environ
+    if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+    # browsers send back exactly the ETag they got; anything else goes through werkzeug's full header parsing
+    if if_none_match == page['quoted_etag'] or (
+            (if_none_match or 'HTTP_IF_MODIFIED_SINCE' in environ)
+            and not is_resource_modified(environ, etag=page['etag'], last_modified=PAGES_BUILT_AT)):
+        return Response(status=304, headers=page['not_modified_headers'])
+    return Response(page['body'], headers=page['headers'])
+
+
+def serve_dynamic_page(auth_html, message_html, content_html):
+    return Response(render_page(auth_html, message_html, content_html),
+                    headers=[('Content-Type', 'text/html; charset=utf-8'),
+                             ('Cache-Control', 'private, no-cache'), ('Vary', 'Cookie')])
+
 @app.route('/')
 def index():
-    people = generate_people(25)
-    auth_html = ''
-    message_html = ''
-    if current_user.is_authenticated:
-        auth_html = f"<span>Hi, {current_user.id}</span> {LOGOUT_FORM}"
-    else:
-        auth_html = f"{LOGIN_FORM} <a href=\"/register\" class=\"btn secondary\">Sign up</a>"
     msg = request.args.get('msg')
+    if current_user.is_authenticated:
+        auth_html = f"<span>Hi, {escape(current_user.id)}</span> {LOGOUT_FORM}"
+        return serve_dynamic_page(auth_html, notice_html(msg), INDEX_CONTENT)
     if msg:
-        message_html = f"<div class=\"notice\">{msg}</div>"
-    content_html = INDEX_CONTENT.replace('{people_json}', json.dumps(people))
-    html = BASE_HTML.replace('__MESSAGE_HTML__', message_html).replace('__CONTENT_HTML__', content_html)
-    html = html.replace('__AUTH_HTML__', auth_html) if '__AUTH_HTML__' in html else html
-    return html
+        return serve_dynamic_page(ANONYMOUS_AUTH_HTML, notice_html(msg), INDEX_CONTENT)
+    return serve_static_page('index')
+
+@app.route('/api/people')
+def api_people():
+    """One page of PEOPLE, sorted on the server.
+    Query: sort=<field> (optional), order=asc|desc, offset=<int>, limit=<int, max MAX_PAGE_SIZE>.
+    Returns {"total", "offset", "limit", "sort", "order", "items"}.
+    """
+    sort_field = request.args.get('sort') or None
+    order = request.args.get('order', 'asc')
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args.get('limit', 25))
+    except ValueError:
+        return ({"error": "offset and limit must be integers"}, 400)
+    if sort_field is not None and sort_field not in SORTABLE_FIELDS:
+        return ({"error": f"cannot sort by {sort_field!r}; choose one of {SORTABLE_FIELDS}"}, 400)
+    if order not in ('asc', 'desc'):
+        return ({"error": "order must be 'asc' or 'desc'"}, 400)
+    if offset < 0 or limit < 0:
+        return ({"error": "offset and limit must not be negative"}, 400)
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    # precomputed index slice; same order (and missing-key handling) as sort_dicts_by_key_inplace_safe
+    items = PEOPLE.page(sort_field, reverse=(sort_field is not None and order == 'desc'), offset=offset, limit=limit)
+    return {
+        "total": len(PEOPLE),
+        "offset": offset,
+        "limit": limit,
+        "sort": sort_field,
+        "order": order,
+        "items": items,
+    }
+
 
 @app.route('/login', methods=['GET','POST'])
 def login():
     if request.method == 'GET':
         # show login form as a page
-        content_html = LOGIN_FORM
-        auth_html = f"<a href=\"/register\" class=\"btn secondary\">Sign up</a>"
-        message_html = request.args.get('msg') or ''
-        html = BASE_HTML.replace('__AUTH_HTML__', auth_html).replace('__MESSAGE_HTML__', f"<div class=\"notice\">{message_html}</div>" if message_html else '').replace('__CONTENT_HTML__', content_html)
-        return html
+        msg = request.args.get('msg')
+        if msg:
+            return serve_dynamic_page(SIGNUP_LINK_HTML, notice_html(msg), LOGIN_FORM)
+        return serve_static_page('login')
 
     # POST: authenticate
     username = request.form.get('username')
     password = request.form.get('password')
-    if username in USERS and check_password_hash(USERS[username], password):
+    password_hash = USER_STORE.get_password_hash(username) if username else None
+    if password_hash and AUTH_POOL.check(password_hash, password):
         user = User(username)
         login_user(user)
         return redirect(url_for('index'))
@@ -242,46 +686,109 @@ def predict():
     bundle = load_model_bundle()
     if bundle is None:
         return ("Model not available", 503)
-    pipe = bundle.get('pipeline') if isinstance(bundle, dict) else bundle
-    label_map = bundle.get('label_map') if isinstance(bundle, dict) else None
-    inv_label_map = {v:k for k,v in label_map.items()} if label_map else None
 
     try:
         features = request.get_json(force=True)
-        # create single-row DataFrame with columns in the same order as training features
-        import pandas as _pd
-        X = _pd.DataFrame([features])
-        pred_enc = pipe.predict(X)[0]
-        pred_label = inv_label_map[int(pred_enc)] if inv_label_map is not None else str(pred_enc)
+        # fill a float64 row in training feature order (no DataFrame on the hot path)
+        pred_label = predict_records(bundle, [features], cache=PREDICTION_CACHE)[0]
         # log prediction (user may be unauthenticated)
         user = current_user.id if current_user.is_authenticated else ''
         log_prediction(user, pred_label, features)
-        return {"prediction": pred_label}
+        return {"prediction": pred_label, "model_version": bundle['version']}
+    except Exception as e:
+        return ({"error": str(e)}, 400)
+
+
+# Upper bound on records per /predict/batch request (keeps one request from holding a worker forever)
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', '10000'))
+
+
+def parse_batch_body(body):
+    """Parse a JSON array or an NDJSON body (one JSON object per line) into a list of feature dicts."""
+    stripped = body.lstrip()
+    if stripped.startswith('['):
+        records = json.loads(stripped)
+    else:
+        records = [json.loads(line) for line in body.splitlines() if line.strip()]
+    if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+        raise ValueError('expected a JSON array or NDJSON stream of feature objects')
+    return records
+
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """Scores many feature dicts with one vectorized pipeline.predict call.
+    Body is either a JSON array of feature objects or NDJSON (one object per line).
+    Returns {"predictions": [...]} in the same order as the input records.
+    """
+    bundle = load_model_bundle()
+    if bundle is None:
+        return ("Model not available", 503)
+
+    try:
+        records = parse_batch_body(request.get_data(as_text=True))
+        if not records:
+            return {"predictions": [], "model_version": bundle['version']}
+        if len(records) > MAX_BATCH_SIZE:
+            return ({"error": f"batch too large: {len(records)} records (max {MAX_BATCH_SIZE})"}, 413)
+        pred_labels = predict_records(bundle, records, cache=PREDICTION_CACHE)
+        user = current_user.id if current_user.is_authenticated else ''
+        log_predictions(user, pred_labels, records)
+        return {"predictions": pred_labels, "model_version": bundle['version']}
     except Exception as e:
         return ({"error": str(e)}, 400)
 
 
+@app.route('/stats')
+def stats():
+    """Counters for sizing the prediction cache and the password hashing pool, and watching the prediction logger."""
+    return {
+        "model_version": current_model_version(),
+        "model_engine": current_model_engine(),
+        "prediction_cache": PREDICTION_CACHE.stats() if PREDICTION_CACHE is not None else None,
+        "prediction_log": PREDICTION_LOGGER.stats(),
+        "auth_pool": AUTH_POOL.stats(),
+    }
+
+
+@app.route('/admin/reload-model', methods=['POST'])
+def admin_reload_model():
+    """Reload model.pkl now in this worker (other workers pick it up on their next change check).
+
+    Requires `Authorization: Bearer <ADMIN_TOKEN>`; disabled (404) when ADMIN_TOKEN is not set.
+    """
+    if not ADMIN_TOKEN:
+        return ({"error": "admin endpoints are disabled (ADMIN_TOKEN is not set)"}, 404)
+    supplied = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(supplied.encode('utf-8'), f'Bearer {ADMIN_TOKEN}'.encode('utf-8')):
+        return ({"error": "admin token required"}, 403)
+    # same guard as the background reload: one load at a time per worker
+    with _MODEL_LOCK:
+        if _RELOAD_STATE['in_progress']:
+            return ({"error": "a reload is already running", "model_version": current_model_version()}, 409)
+        _RELOAD_STATE['in_progress'] = True
+    bundle = reload_model_bundle()
+    if bundle is None:
+        return ({"error": f"reload failed: {_RELOAD_STATE['last_error']}", "model_version": current_model_version()}, 500)
+    return {"model_version": bundle['version']}
+
+
 @app.route('/register', methods=['GET','POST'])
 def register():
     if request.method == 'GET':
         # show a simple register page
-        content_html = REGISTER_FORM
-        auth_html = LOGIN_FORM
-        message_html = ''
-        html = BASE_HTML.replace('__AUTH_HTML__', auth_html).replace('__MESSAGE_HTML__', message_html).replace('__CONTENT_HTML__', content_html)
-        return html
+        return serve_static_page('register')
 
     # POST: create user if not exists
     username = request.form.get('username')
     password = request.form.get('password')
     if not username or not password:
         return redirect(url_for('index', msg='Username and password required.'))
-    if username in USERS:
+    if USER_STORE.exists(username):
+        return redirect(url_for('index', msg='Username already exists. Please choose another.'))
+    # store hashed password; the insert also fails if another worker took the name since the check above
+    if not USER_STORE.add(username, AUTH_POOL.generate(password)):
         return redirect(url_for('index', msg='Username already exists. Please choose another.'))
-    # store hashed password
-    USERS[username] = generate_password_hash(password)
-    with open('users.json', 'w', encoding='utf-8') as f:
-        json.dump(USERS, f, indent=2)
     # Do not auto-login: redirect user to the login page
     return redirect(url_for('login', msg='Account created. Please log in.'))
 
@@ -291,5 +798,8 @@ def logout():
         logout_user()
         return redirect(url_for('index', msg='You have been logged out.'))
 
+if os.environ.get('PRELOAD_MODEL') == '1':
+    preload_model()
+
 if __name__ == '__main__':
         app.run(debug=False)
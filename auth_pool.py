@@ -0,0 +1,149 @@
+"""
+auth_pool.py
+
+Bounded pool for the password KDF calls in app.py (werkzeug's scrypt/pbkdf2 hashing and verification).
+
+The KDFs are deliberately slow (~100 ms of CPU each). Run inline, a burst of logins occupies every request thread
+and /predict waits behind them. Here they run on a small, fixed set of threads (`workers`). At most `max_pending`
+more calls may wait for a thread; a call arriving when the pool is full raises `AuthPoolBusy` at once, and app.py
+turns that into a 503 with Retry-After. That caps the request threads auth can hold at workers + max_pending, and the
+rest stay free for inference. A call that has waited `timeout` seconds without a result also raises AuthPoolBusy. If
+it had not started yet it is cancelled, so stale work doesn't pile up.
+
+hashlib's scrypt and pbkdf2 release the GIL, so the pool threads hash in parallel with request threads. Like
+PredictionLogger, the threads are started lazily and again after a fork (gunicorn workers don't inherit threads).
+
+`stats()` reports admission counters and queue wait and run times (ms) over the last `window` calls, for sizing
+`workers` and `max_pending`.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import numpy as np
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class AuthPoolBusy(Exception):
+    """The pool is saturated or a call took longer than its timeout; the request should be retried later."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class PasswordHashPool:
+    def __init__(self, workers=2, max_pending=8, timeout=5.0, retry_after=1, window=1024):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.errors = 0
+        self._in_flight = 0
+        self._queue_ms = deque(maxlen=window)
+        self._run_ms = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def check(self, pwhash, password):
+        """check_password_hash on a pool thread."""
+        return self.run(check_password_hash, pwhash, password)
+
+    def generate(self, password):
+        """generate_password_hash on a pool thread."""
+        return self.run(generate_password_hash, password)
+
+    def run(self, fn, *args):
+        """Run fn(*args) on the pool and return its result; raises AuthPoolBusy instead of queueing without bound."""
+        executor = self._ensure_started()
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_pending:
+                self.rejected += 1
+                raise AuthPoolBusy('password hashing pool is full', self.retry_after)
+            self._in_flight += 1
+            self.submitted += 1
+        try:
+            future = executor.submit(self._timed, fn, args, time.perf_counter())
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._done)
+        try:
+            return future.result(self.timeout)
+        except (FutureTimeoutError, CancelledError):
+            # not started yet: drop it; already hashing: let it finish, its slot frees when it does
+            future.cancel()
+            with self._lock:
+                self.timeouts += 1
+            raise AuthPoolBusy('password hashing timed out', self.retry_after)
+
+    def stats(self):
+        with self._lock:
+            queue_ms = np.array(self._queue_ms, dtype=np.float64)
+            run_ms = np.array(self._run_ms, dtype=np.float64)
+            counters = {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'in_flight': self._in_flight,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'errors': self.errors,
+            }
+        counters['queue_ms'] = _summary(queue_ms)
+        counters['run_ms'] = _summary(run_ms)
+        return counters
+
+    def _timed(self, fn, args, enqueued):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self._queue_ms.append((started - enqueued) * 1000.0)
+                self._run_ms.append((finished - started) * 1000.0)
+
+    def _done(self, future):
+        with self._lock:
+            if not future.cancelled():
+                if future.exception() is None:
+                    self.completed += 1
+                else:
+                    self.errors += 1
+        self._release()
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _ensure_started(self):
+        # threads are started lazily, and again after a fork
+        if self._executor is not None and self._pid == os.getpid():
+            return self._executor
+        with self._start_lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+                self._pid = os.getpid()
+                with self._lock:
+                    self._in_flight = 0
+            return self._executor
+
+
+def _summary(values):
+    if not len(values):
+        return {'count': 0, 'p50': None, 'p95': None, 'max': None}
+    p50, p95 = np.percentile(values, [50, 95])
+    return {'count': int(len(values)), 'p50': round(float(p50), 3), 'p95': round(float(p95), 3),
+            'max': round(float(values.max()), 3)}
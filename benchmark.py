@@ -0,0 +1,261 @@
+"""
+benchmark.py
+
+Reproducible benchmarks for sort.py and the /predict path, written as JSON so results can be
+stored and compared.
+
+`run` times every sort.py variant over a grid of list sizes, key types and missing-key ratios
+(seeded data, best and median of `--repeat` runs, each on a fresh copy). It also measures
+in-process /predict latency percentiles and /predict/batch throughput through Flask's test
+client. `compare` checks a new result file against a stored baseline. It exits with status 1
+when any metric is worse than the baseline by more than `--threshold`.
+
+Usage:
+  python benchmark.py run -o bench.json
+  python benchmark.py run --sizes 1000,100000 --key-types int,str --missing 0,0.2 --skip-predict -o bench.json
+  python benchmark.py compare baseline.json bench.json --threshold 0.15
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import sort
+from external_sort import external_sort
+
+# missing_value per key type: comparable with the generated values, so every variant can run
+MISSING_VALUES = {'int': -1, 'float': -1.0, 'str': ''}
+
+# name -> (function(data, key, missing_value) returning the sorted list, needs every dict to have the key)
+SORT_VARIANTS = {
+    'ai': (lambda lst, key, mv: sort.sort_dicts_by_key_ai(lst, key), True),
+    'inplace_fast': (lambda lst, key, mv: sort.sort_dicts_by_key_inplace_fast(lst, key), True),
+    'inplace_safe': (lambda lst, key, mv: sort.sort_dicts_by_key_inplace_safe(lst, key, missing_value=mv), False),
+    'dsu': (lambda lst, key, mv: sort.sort_dicts_by_key_dsu(lst, key, missing_value=mv), False),
+    'numpy': (lambda lst, key, mv: sort.sort_dicts_by_key_numpy(lst, key, missing_value=mv), False),
+    'keys': (lambda lst, key, mv: sort.sort_dicts_by_keys(lst, [(key, 'asc', mv)]), False),
+    'parallel': (lambda lst, key, mv: sort.sort_dicts_by_key_parallel(lst, key, missing_value=mv, min_size=0), False),
+    'external': (lambda lst, key, mv: list(external_sort(lst, key, missing_value=mv, chunk_size=max(1, len(lst) // 4))), False),
+    'top_k_100': (lambda lst, key, mv: sort.top_k_dicts_by_key(lst, key, 100, missing_value=mv), False),
+}
+
+
+def make_records(n, key_type, missing_ratio, seed=0):
+    rng = random.Random(seed)
+    make = {
+        'int': lambda: rng.randint(0, 1000000),
+        'float': rng.random,
+        'str': lambda: ''.join(rng.choice('abcdefghij') for _ in range(8)),
+    }[key_type]
+    records = []
+    for i in range(n):
+        record = {'id': i}
+        if rng.random() >= missing_ratio:
+            record['k'] = make()
+        records.append(record)
+    return records
+
+
+def time_call(fn, data, repeat):
+    # each run sorts a fresh copy; the copy is not timed
+    times = []
+    result = None
+    for _ in range(repeat):
+        copy = list(data)
+        start = time.perf_counter()
+        result = fn(copy)
+        times.append(time.perf_counter() - start)
+    return times, result
+
+
+def bench_sort(sizes, key_types, missing_ratios, repeat, seed):
+    results = []
+    for n in sizes:
+        for key_type in key_types:
+            for missing in missing_ratios:
+                data = make_records(n, key_type, missing, seed)
+                mv = MISSING_VALUES[key_type]
+                expected = sort.sort_dicts_by_key_inplace_safe(list(data), 'k', missing_value=mv)
+                for variant, (fn, needs_key) in SORT_VARIANTS.items():
+                    if needs_key and missing > 0:
+                        continue
+                    times, out = time_call(lambda lst: fn(lst, 'k', mv), data, repeat)
+                    # a fast wrong answer is worthless: check against the reference order
+                    ok = out == (expected[:100] if variant == 'top_k_100' else expected)
+                    results.append({
+                        'name': f'sort/{variant}/n={n}/key={key_type}/missing={missing:g}',
+                        'group': 'sort', 'variant': variant, 'n': n, 'key_type': key_type, 'missing_ratio': missing,
+                        'metric': 'seconds', 'better': 'lower', 'value': min(times),
+                        'median': statistics.median(times), 'repeat': repeat, 'correct': ok,
+                    })
+                    print(f"{results[-1]['name']:<55} {min(times) * 1000:10.2f} ms{'' if ok else '  WRONG ORDER'}")
+    return results
+
+
+def _percentile(sorted_values, q):
+    idx = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+
+def bench_predict(requests_count, batch_size, batch_repeat, seed):
+    # keep benchmark traffic out of the real prediction log and the cache out of the measurement
+    log_dir = tempfile.mkdtemp(prefix='bench-log-')
+    os.environ['PREDICTION_LOG_PATH'] = os.path.join(log_dir, 'prediction_logs.csv')
+    os.environ['PREDICTION_CACHE_SIZE'] = '0'
+    os.environ['MODEL_RELOAD_INTERVAL'] = '0'
+    import app as webapp
+    from sklearn.datasets import load_breast_cancer
+
+    X = load_breast_cancer(as_frame=True).frame.drop(columns=['target'])
+    sample = X.sample(max(requests_count, batch_size), replace=True, random_state=seed)
+    records = [{col: float(val) for col, val in row.items()} for _, row in sample.iterrows()]
+    if webapp.load_model_bundle() is None:
+        print('model not available; skipping /predict benchmarks')
+        return []
+
+    client = webapp.app.test_client()
+    bodies = [json.dumps(r) for r in records[:requests_count]]
+    client.post('/predict', data=bodies[0], content_type='application/json')  # warm-up
+    latencies = []
+    for body in bodies:
+        start = time.perf_counter()
+        resp = client.post('/predict', data=body, content_type='application/json')
+        latencies.append(time.perf_counter() - start)
+        if resp.status_code != 200:
+            raise RuntimeError(f'/predict returned {resp.status_code}: {resp.get_data(as_text=True)}')
+    latencies.sort()
+
+    batch_body = json.dumps(records[:batch_size])
+    throughputs = []
+    for _ in range(batch_repeat):
+        start = time.perf_counter()
+        resp = client.post('/predict/batch', data=batch_body, content_type='application/json')
+        elapsed = time.perf_counter() - start
+        if resp.status_code != 200:
+            raise RuntimeError(f'/predict/batch returned {resp.status_code}: {resp.get_data(as_text=True)}')
+        throughputs.append(batch_size / elapsed)
+    webapp.PREDICTION_LOGGER.close()
+
+    common = {'group': 'predict', 'model_version': webapp.current_model_version()}
+    results = [
+        dict(common, name=f'predict/latency_p{q}', metric='seconds', better='lower', value=_percentile(latencies, q),
+             requests=len(latencies))
+        for q in (50, 90, 99)
+    ]
+    results.append(dict(common, name='predict/latency_mean', metric='seconds', better='lower',
+                        value=statistics.fmean(latencies), requests=len(latencies)))
+    results.append(dict(common, name=f'predict_batch/throughput/batch={batch_size}', metric='records_per_second',
+                        better='higher', value=max(throughputs), median=statistics.median(throughputs),
+                        repeat=batch_repeat))
+    for r in results:
+        unit = 'rec/s' if r['metric'] == 'records_per_second' else 'ms'
+        value = r['value'] if unit == 'rec/s' else r['value'] * 1000
+        print(f"{r['name']:<55} {value:10.2f} {unit}")
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'git_commit': commit,
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': numpy_version,
+    }
+
+
+def compare(baseline, current, threshold):
+    """Return (rows, regressions); a row is (name, baseline value, current value, relative change, status)."""
+    base = {r['name']: r for r in baseline['results']}
+    rows, regressions = [], []
+    for r in current['results']:
+        b = base.get(r['name'])
+        if b is None or not b['value']:
+            rows.append((r['name'], None, r['value'], None, 'new'))
+            continue
+        change = (r['value'] - b['value']) / b['value']
+        worse = change > threshold if r['better'] == 'lower' else change < -threshold
+        better = change < -threshold if r['better'] == 'lower' else change > threshold
+        status = 'REGRESSION' if worse else ('improved' if better else 'ok')
+        if r.get('correct') is False:
+            status = 'WRONG ORDER'
+            worse = True
+        rows.append((r['name'], b['value'], r['value'], change, status))
+        if worse:
+            regressions.append(r['name'])
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark sort.py and the /predict path.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    run = sub.add_parser('run', help='run the benchmarks and write JSON results')
+    run.add_argument('--sizes', default='1000,10000,100000')
+    run.add_argument('--key-types', default='int,float,str')
+    run.add_argument('--missing', default='0,0.1', help='comma-separated missing-key ratios')
+    run.add_argument('--repeat', type=int, default=5)
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--predict-requests', type=int, default=500)
+    run.add_argument('--batch-size', type=int, default=1000)
+    run.add_argument('--batch-repeat', type=int, default=5)
+    run.add_argument('--skip-sort', action='store_true')
+    run.add_argument('--skip-predict', action='store_true')
+    run.add_argument('-o', '--output', default='benchmark_results.json')
+    cmp_ = sub.add_parser('compare', help='compare results with a baseline; exit 1 on regressions')
+    cmp_.add_argument('baseline')
+    cmp_.add_argument('current')
+    cmp_.add_argument('--threshold', type=float, default=0.10, help='allowed relative slowdown (0.10 = 10%%)')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        results = []
+        if not args.skip_sort:
+            results += bench_sort([int(s) for s in args.sizes.split(',')], args.key_types.split(','),
+                                  [float(m) for m in args.missing.split(',')], args.repeat, args.seed)
+        if not args.skip_predict:
+            results += bench_predict(args.predict_requests, args.batch_size, args.batch_repeat, args.seed)
+        out = {'environment': environment(), 'config': vars(args), 'results': results}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(out, f, indent=2)
+        print('Wrote', len(results), 'results to', args.output)
+        if any(r.get('correct') is False for r in results):
+            sys.exit(1)
+        return
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, 'r', encoding='utf-8') as f:
+        current = json.load(f)
+    if baseline['environment'].get('platform') != current['environment'].get('platform'):
+        print('warning: baseline was recorded on a different platform; compare with care')
+    rows, regressions = compare(baseline, current, args.threshold)
+    for name, b, c, change, status in rows:
+        change_text = '' if change is None else f'{change:+8.1%}'
+        b_text = '' if b is None else f'{b:.6g}'
+        print(f'{name:<55} {b_text:>12} {c:>12.6g} {change_text:>9}  {status}')
+    if regressions:
+        print(f'{len(regressions)} regression(s) beyond {args.threshold:.0%}')
+        sys.exit(1)
+    print('no regressions')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+external_sort.py
+
+Streaming external merge sort for record sets larger than memory, such as NDJSON exports
+(requests.jsonl) or the CSV prediction logs.
+
+Records are read lazily and sorted in chunks of `chunk_size` with the same key semantics as
+sort.sort_dicts_by_key_inplace_safe (missing keys sort as `missing_value`, stable, `reverse`).
+Each sorted chunk is spilled to a temporary run file, and the runs are k-way merged with
+heapq.merge into an iterator. Memory holds one chunk while reading, then one block of records
+per open run while merging, however large the input is. When there are more runs than
+`max_open_runs`, consecutive runs are merged in extra passes first. Runs are created and merged
+in input order and heapq.merge prefers earlier runs on ties, so the result is stable.
+
+Usage:
+  python external_sort.py records.ndjson --key age --reverse -o sorted.ndjson
+  python external_sort.py prediction_logs.csv --format csv --fieldnames timestamp,user,prediction,features --key timestamp
+"""
+import argparse
+import csv
+import heapq
+import json
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from sort import sort_dicts_by_key_inplace_safe
+
+# records per pickle.dump call in a run file (and per block held in memory per run while merging)
+RUN_BLOCK_SIZE = 1024
+
+
+def iter_ndjson(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_csv(path: str, fieldnames: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    """Yield CSV rows as dicts; pass `fieldnames` for headerless files such as prediction_logs.csv."""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        yield from csv.DictReader(f, fieldnames=fieldnames)
+
+
+def write_ndjson(records: Iterable[Dict[str, Any]], f) -> int:
+    n = 0
+    for record in records:
+        f.write(json.dumps(record, ensure_ascii=False))
+        f.write('\n')
+        n += 1
+    return n
+
+
+def write_csv(records: Iterable[Dict[str, Any]], f, fieldnames: List[str], header: bool = True) -> int:
+    writer = csv.DictWriter(f, fieldnames=fieldnames)
+    if header:
+        writer.writeheader()
+    n = 0
+    for record in records:
+        writer.writerow(record)
+        n += 1
+    return n
+
+
+def _key_func(key: str, missing_value: Any, key_type: Optional[Callable[[Any], Any]]):
+    if key_type is None:
+        return lambda d: d.get(key, missing_value)
+
+    def typed(d):
+        v = d.get(key)
+        return missing_value if v is None or v == '' else key_type(v)
+    return typed
+
+
+def _write_run(records: Iterable[Dict[str, Any]], directory: str, index: int) -> str:
+    path = os.path.join(directory, f'run-{index:06d}.pkl')
+    with open(path, 'wb') as f:
+        it = iter(records)
+        while True:
+            block = list(islice(it, RUN_BLOCK_SIZE))
+            if not block:
+                break
+            pickle.dump(block, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def _read_run(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                block = pickle.load(f)
+            except EOFError:
+                return
+            yield from block
+
+
+def external_sort(records: Iterable[Dict[str, Any]], key: str, reverse: bool = False, missing_value: Optional[Any] = None,
+                  chunk_size: int = 100000, max_open_runs: int = 64, tmp_dir: Optional[str] = None,
+                  key_type: Optional[Callable[[Any], Any]] = None) -> Iterator[Dict[str, Any]]:
+    """Yield `records` sorted by `key` using bounded memory (see module docstring).
+
+    `key_type` converts present key values before comparing (e.g. float for CSV columns, which
+    are read as strings); missing or empty values then sort as `missing_value`.
+    Temporary run files live in a private directory under `tmp_dir` and are removed when the
+    iterator is exhausted or closed.
+    """
+    if chunk_size < 1 or max_open_runs < 2:
+        raise ValueError('chunk_size must be >= 1 and max_open_runs >= 2')
+    get_key = _key_func(key, missing_value, key_type)
+    directory = tempfile.mkdtemp(prefix='external-sort-', dir=tmp_dir)
+    try:
+        runs = []
+        it = iter(records)
+        while True:
+            chunk = list(islice(it, chunk_size))
+            if not chunk:
+                break
+            if key_type is None:
+                sort_dicts_by_key_inplace_safe(chunk, key, reverse=reverse, missing_value=missing_value)
+            else:
+                chunk.sort(key=get_key, reverse=reverse)
+            if not runs and len(chunk) < chunk_size:
+                # everything fit in one chunk: no need to touch the disk
+                yield from chunk
+                return
+            runs.append(_write_run(chunk, directory, len(runs)))
+            del chunk
+
+        next_index = len(runs)
+        while len(runs) > max_open_runs:
+            # merge consecutive groups so earlier runs stay earlier (keeps ties in input order)
+            merged = []
+            for start in range(0, len(runs), max_open_runs):
+                group = runs[start:start + max_open_runs]
+                if len(group) == 1:
+                    merged.append(group[0])
+                    continue
+                stream = heapq.merge(*(_read_run(p) for p in group), key=get_key, reverse=reverse)
+                merged.append(_write_run(stream, directory, next_index))
+                next_index += 1
+                for p in group:
+                    os.remove(p)
+            runs = merged
+
+        yield from heapq.merge(*(_read_run(p) for p in runs), key=get_key, reverse=reverse)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sort NDJSON or CSV records by a key with bounded memory.')
+    parser.add_argument('input')
+    parser.add_argument('--key', required=True)
+    parser.add_argument('--reverse', action='store_true')
+    parser.add_argument('--format', choices=['ndjson', 'csv'], default=None, help='default: from the file extension')
+    parser.add_argument('--fieldnames', default=None, help='comma-separated CSV column names for headerless files')
+    parser.add_argument('--numeric', action='store_true', help='compare key values as numbers (CSV values are strings)')
+    parser.add_argument('--missing-value', default=None, help='value used for records without the key')
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--max-open-runs', type=int, default=64)
+    parser.add_argument('--tmp-dir', default=None)
+    parser.add_argument('-o', '--output', default=None, help='output file (default: stdout)')
+    args = parser.parse_args()
+
+    fmt = args.format or ('csv' if args.input.lower().endswith('.csv') else 'ndjson')
+    fieldnames = args.fieldnames.split(',') if args.fieldnames else None
+    records = iter_csv(args.input, fieldnames) if fmt == 'csv' else iter_ndjson(args.input)
+    missing_value = args.missing_value
+    if args.numeric and missing_value is not None:
+        missing_value = float(missing_value)
+    stream = external_sort(records, args.key, reverse=args.reverse, missing_value=missing_value,
+                           chunk_size=args.chunk_size, max_open_runs=args.max_open_runs, tmp_dir=args.tmp_dir,
+                           key_type=float if args.numeric else None)
+
+    out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        if fmt == 'csv':
+            first = next(stream, None)
+            if first is not None:
+                header = fieldnames is None
+                write_csv(_prepend(first, stream), out, fieldnames or list(first), header=header)
+        else:
+            write_ndjson(stream, out)
+    finally:
+        if args.output:
+            out.close()
+
+
+def _prepend(first, rest):
+    yield first
+    yield from rest
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,38 @@
 """
 fairness_audit.py
 
-Loads model.pkl and runs a simple fairness audit. Since we don't have a real 'team' field,
-we synthesize a `team` attribute and compute per-team accuracy and macro-F1. If AIF360
-is available, compute statistical parity and disparate impact for the 'high' priority class.
+Loads model.pkl and runs a fairness audit. Since we don't have real protected attributes, we synthesize several
+(`team`, `region`, `seniority`) and compute per-group accuracy, macro-F1, positive rates, statistical parity and
+disparate impact for the 'high' priority class, for every attribute and for their intersections (e.g. team&region).
+If AIF360 is available, its statistical parity and disparate impact for `team` are reported as a cross-check.
 
-The script writes `fairness_report.json` with the computed metrics.
+The engine is vectorized: group membership is an integer code per row, and one np.bincount over
+(group, true label, predicted label) gives a confusion tensor of shape (groups, classes, classes) for an attribute or
+intersection. Every metric is computed from those counts with array arithmetic over the leading group axis, so the
+cost is a few passes over the rows however many groups there are. `confusion_by_group` and `audit_from_confusion`
+also work on counts accumulated elsewhere (see fairness_stream.py).
+
+`--bootstrap N` adds percentile confidence intervals for every group metric. Resampling rows with replacement is
+the same as drawing multinomial counts over the joint (attributes, true, predicted) cells with the observed cell
+frequencies. So each resample is one multinomial draw over a few hundred cells, and every attribute and intersection
+is a marginal sum of it. Resamples are split into fixed-size chunks. Each chunk has its own child of one
+SeedSequence and runs in a process pool, so the intervals depend only on --seed, not on --workers.
+
+The script audits the full dataset (or `--rows N` resampled rows for scale tests) and writes `fairness_report.json`
+with the per-attribute results plus the original `overall_accuracy`, `per_team` and `parity` keys used by
+generate_audit_pdf.py.
 """
+import argparse
+import itertools
 import json
-import random
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
 import joblib
 import numpy as np
-import pandas as pd
 from sklearn.datasets import load_breast_cancer
-from sklearn.metrics import accuracy_score, f1_score
 
 try:
     from aif360.datasets import BinaryLabelDataset
@@ -22,110 +41,369 @@ try:
 except Exception:
     AIF360_AVAILABLE = False
 
+# synthetic protected attributes: name -> (groups, sampling probabilities)
+SYNTHETIC_ATTRIBUTES = {
+    'team': (['team_A', 'team_B', 'team_C'], [0.7, 0.2, 0.1]),
+    'region': (['north', 'south', 'east', 'west'], [0.4, 0.3, 0.2, 0.1]),
+    'seniority': (['junior', 'senior'], [0.6, 0.4]),
+}
+# reference group per attribute for parity; attributes not listed use their largest group
+PRIVILEGED_GROUPS = {'team': 'team_A'}
+# the legacy `parity` block compares this group of `team` with the privileged one
+LEGACY_UNPRIVILEGED_TEAM = 'team_C'
+
+LABEL_NAMES = ['low', 'medium', 'high']
+POSITIVE_LABEL = 'high'
+
+
+def synthesize_attributes(n, rng, attributes=SYNTHETIC_ATTRIBUTES):
+    """name -> int codes (n,) drawn with the attribute's group probabilities."""
+    return {name: rng.choice(len(groups), size=n, p=probs) for name, (groups, probs) in attributes.items()}
+
+
+def priority_labels(scores, reference_scores):
+    """Encoded low/medium/high (0/1/2, LABEL_NAMES order) from the 33rd/66th percentiles of `reference_scores`,
+    the same rule as train_priority_model.create_priority_labels."""
+    q1 = np.percentile(reference_scores, 33)
+    q2 = np.percentile(reference_scores, 66)
+    # right=True: x <= q1 -> 0, q1 < x <= q2 -> 1, x > q2 -> 2
+    return np.digitize(scores, [q1, q2], right=True)
+
+
+def intersect_codes(codes_list, sizes):
+    """Mixed-radix code for the intersection of several attributes and its group count."""
+    combined = np.zeros(len(codes_list[0]), dtype=np.int64)
+    for codes, size in zip(codes_list, sizes):
+        combined = combined * size + codes
+    return combined, int(np.prod(sizes))
+
+
+def intersection_names(group_lists):
+    """Group names for intersect_codes order, e.g. 'team_A&north'."""
+    return ['&'.join(parts) for parts in itertools.product(*group_lists)]
+
+
+def confusion_by_group(codes, y_true, y_pred, n_groups, n_classes):
+    """(n_groups, n_classes, n_classes) counts of [group, true, predicted] from one bincount."""
+    flat = (np.asarray(codes, dtype=np.int64) * n_classes + y_true) * n_classes + y_pred
+    counts = np.bincount(flat, minlength=n_groups * n_classes * n_classes)
+    return counts.reshape(n_groups, n_classes, n_classes)
+
+
+def confusion_metrics(cm, positive):
+    """Metrics for confusion counts of shape (..., classes, classes), vectorized over the leading axes.
+
+    f1_macro averages over the classes present in the true or predicted labels of each group, like
+    sklearn's f1_score(average='macro'). Rates are NaN for empty groups.
+    """
+    cm = np.asarray(cm, dtype=np.float64)
+    support = cm.sum(axis=(-2, -1))
+    diag = np.diagonal(cm, axis1=-2, axis2=-1)
+    true_counts = cm.sum(axis=-1)
+    pred_counts = cm.sum(axis=-2)
+    denom = true_counts + pred_counts
+    present = denom > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        f1_per_class = np.where(present, 2 * diag / denom, 0.0)
+        return {
+            'support': support,
+            'accuracy': diag.sum(axis=-1) / support,
+            'f1_macro': f1_per_class.sum(axis=-1) / present.sum(axis=-1),
+            'positive_rate': pred_counts[..., positive] / support,
+            'base_rate': true_counts[..., positive] / support,
+            'true_positive_rate': diag[..., positive] / true_counts[..., positive],
+        }
+
+
+def parity_metrics(positive_rate, privileged):
+    """Statistical parity difference and disparate impact of every group against group index `privileged`."""
+    ref = positive_rate[..., privileged, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return positive_rate - ref, np.where(ref > 0, positive_rate / ref, np.nan)
+
+
+def _num(x):
+    x = float(x)
+    return None if np.isnan(x) or np.isinf(x) else x
+
+
+def group_report(cm, group_names, positive, privileged=None):
+    """Report dict for one attribute or intersection from its (groups, classes, classes) counts; empty groups are omitted."""
+    m = confusion_metrics(cm, positive)
+    if privileged is None:
+        privileged = int(np.argmax(m['support']))
+    spd, di = parity_metrics(m['positive_rate'], privileged)
+    groups = {}
+    for i, name in enumerate(group_names):
+        if m['support'][i] == 0:
+            continue
+        groups[name] = {
+            'support': int(m['support'][i]),
+            'accuracy': _num(m['accuracy'][i]),
+            'f1_macro': _num(m['f1_macro'][i]),
+            'positive_rate': _num(m['positive_rate'][i]),
+            'base_rate': _num(m['base_rate'][i]),
+            'true_positive_rate': _num(m['true_positive_rate'][i]),
+            'statistical_parity_difference': _num(spd[i]),
+            'disparate_impact': _num(di[i]),
+        }
+    nonempty = m['support'] > 0
+    return {
+        'privileged': group_names[privileged],
+        'groups': groups,
+        'max_abs_statistical_parity_difference': _num(np.nanmax(np.abs(spd[nonempty]))) if nonempty.any() else None,
+        'min_disparate_impact': _num(np.nanmin(di[nonempty])) if nonempty.any() and not np.isnan(di[nonempty]).all() else None,
+    }
+
+
+def audit_from_confusion(overall_cm, attribute_cms, attributes=SYNTHETIC_ATTRIBUTES, max_order=2,
+                         label_names=LABEL_NAMES, positive_label=POSITIVE_LABEL):
+    """Full report from confusion counts. `attribute_cms` maps an attribute name, or a tuple of names for an
+    intersection, to its (groups, classes, classes) counts (group order as intersect_codes)."""
+    positive = label_names.index(positive_label)
+    overall = confusion_metrics(overall_cm, positive)
+    report = {
+        'n_rows': int(overall['support']),
+        'overall_accuracy': _num(overall['accuracy']),
+        'overall_f1_macro': _num(overall['f1_macro']),
+        'positive_label': positive_label,
+        'attributes': {},
+        'intersections': {},
+    }
+    for key, cm in attribute_cms.items():
+        names = (key,) if isinstance(key, str) else tuple(key)
+        if len(names) > max_order:
+            continue
+        group_names = intersection_names([attributes[n][0] for n in names])
+        privileged = None
+        if len(names) == 1 and names[0] in PRIVILEGED_GROUPS:
+            privileged = group_names.index(PRIVILEGED_GROUPS[names[0]])
+        target = report['attributes'] if len(names) == 1 else report['intersections']
+        target['&'.join(names)] = group_report(cm, group_names, positive, privileged)
+
+    team = report['attributes'].get('team')
+    if team is not None:
+        # keys read by generate_audit_pdf.py
+        report['per_team'] = {g: {'accuracy': m['accuracy'], 'f1_macro': m['f1_macro'], 'support': m['support']}
+                              for g, m in team['groups'].items()}
+        rates = {g: m['positive_rate'] for g, m in team['groups'].items()}
+        priv_rate = rates.get(PRIVILEGED_GROUPS['team']) or 0.0
+        unpriv_rate = rates.get(LEGACY_UNPRIVILEGED_TEAM) or 0.0
+        report['parity'] = {
+            'group_positive_rate': rates,
+            'statistical_parity_difference': unpriv_rate - priv_rate,
+            'disparate_impact': (unpriv_rate / priv_rate) if priv_rate > 0 else None,
+        }
+    return report
+
+
+def attribute_confusions(codes, y_true, y_pred, attributes=SYNTHETIC_ATTRIBUTES, max_order=2, n_classes=len(LABEL_NAMES)):
+    """Confusion counts for every attribute and every intersection of up to `max_order` attributes."""
+    cms = {}
+    names = list(attributes)
+    for order in range(1, max_order + 1):
+        for combo in itertools.combinations(names, order):
+            sizes = [len(attributes[n][0]) for n in combo]
+            combined, n_groups = intersect_codes([codes[n] for n in combo], sizes)
+            cms[combo[0] if order == 1 else combo] = confusion_by_group(combined, y_true, y_pred, n_groups, n_classes)
+    return cms
+
+
+# metrics that get bootstrap intervals (all per-group numbers in group_report)
+CI_METRICS = ['accuracy', 'f1_macro', 'positive_rate', 'base_rate', 'true_positive_rate',
+              'statistical_parity_difference', 'disparate_impact']
+# resamples per task: fixed so each chunk's seed (and so the result) doesn't depend on the worker count
+BOOTSTRAP_CHUNK = 500
+
+
+def joint_cell_counts(codes, y_true, y_pred, attributes=SYNTHETIC_ATTRIBUTES, n_classes=len(LABEL_NAMES)):
+    """Counts over every combination of all attributes' groups plus (true, predicted): shape (g1, ..., gk, C, C)."""
+    names = list(attributes)
+    sizes = [len(attributes[n][0]) for n in names]
+    combined, n_groups = intersect_codes([codes[n] for n in names], sizes)
+    return confusion_by_group(combined, y_true, y_pred, n_groups, n_classes).reshape(sizes + [n_classes, n_classes])
+
 
-def synthesize_team(n):
-    # create 3 teams with imbalance
-    teams = []
-    for i in range(n):
-        r = random.random()
-        if r < 0.7:
-            teams.append('team_A')
-        elif r < 0.9:
-            teams.append('team_B')
+def marginal_confusions(joint, attribute_names, max_order=2):
+    """attribute_confusions' result computed from joint counts with optional leading resample axes."""
+    k = len(attribute_names)
+    lead = joint.ndim - k - 2
+    cms = {}
+    for order in range(1, max_order + 1):
+        for combo in itertools.combinations(range(k), order):
+            drop = tuple(lead + i for i in range(k) if i not in combo)
+            cm = joint.sum(axis=drop) if drop else joint
+            n_groups = int(np.prod([joint.shape[lead + i] for i in combo]))
+            key = attribute_names[combo[0]] if order == 1 else tuple(attribute_names[i] for i in combo)
+            cms[key] = cm.reshape(joint.shape[:lead] + (n_groups,) + joint.shape[-2:])
+    return cms
+
+
+def _bootstrap_chunk(task):
+    # one process-pool task: `size` resamples as multinomial cell counts -> metric arrays of shape (size, groups)
+    probs, n_rows, size, seed, shape, attribute_names, max_order, positive, privileged = task
+    rng = np.random.default_rng(seed)
+    joint = rng.multinomial(n_rows, probs, size=size).reshape((size,) + shape)
+    out = {}
+    overall = confusion_metrics(joint.sum(axis=tuple(range(1, 1 + len(attribute_names)))), positive)
+    out['overall'] = {'accuracy': overall['accuracy'], 'f1_macro': overall['f1_macro']}
+    for key, cm in marginal_confusions(joint, attribute_names, max_order).items():
+        m = confusion_metrics(cm, positive)
+        spd, di = parity_metrics(m['positive_rate'], privileged[key])
+        m['statistical_parity_difference'], m['disparate_impact'] = spd, di
+        out[key] = {metric: m[metric] for metric in CI_METRICS}
+    return out
+
+
+def bootstrap_intervals(codes, y_true, y_pred, resamples=10000, confidence=0.95, seed=42, workers=None,
+                        attributes=SYNTHETIC_ATTRIBUTES, max_order=2, label_names=LABEL_NAMES, positive_label=POSITIVE_LABEL):
+    """Percentile intervals: {'overall' or attribute key: {metric: (lo, hi) arrays over groups}}.
+    Groups that are empty in a resample contribute NaN to it and are left out of its percentiles."""
+    names = list(attributes)
+    positive = label_names.index(positive_label)
+    joint = joint_cell_counts(codes, y_true, y_pred, attributes, len(label_names))
+    n_rows = int(joint.sum())
+    probs = (joint / n_rows).ravel()
+    privileged = {}
+    for key, cm in marginal_confusions(joint, names, max_order).items():
+        if isinstance(key, str) and key in PRIVILEGED_GROUPS:
+            privileged[key] = attributes[key][0].index(PRIVILEGED_GROUPS[key])
         else:
-            teams.append('team_C')
-    return np.array(teams)
+            # same reference as group_report: the largest observed group
+            privileged[key] = int(np.argmax(cm.sum(axis=(-2, -1))))
+
+    sizes = [BOOTSTRAP_CHUNK] * (resamples // BOOTSTRAP_CHUNK)
+    if resamples % BOOTSTRAP_CHUNK:
+        sizes.append(resamples % BOOTSTRAP_CHUNK)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(probs, n_rows, size, child, joint.shape, names, max_order, positive, privileged)
+             for size, child in zip(sizes, seeds)]
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            chunks = list(pool.map(_bootstrap_chunk, tasks))
+    else:
+        chunks = [_bootstrap_chunk(t) for t in tasks]
+
+    alpha = (1.0 - confidence) / 2
+    intervals = {}
+    for key in chunks[0]:
+        intervals[key] = {}
+        for metric in chunks[0][key]:
+            values = np.concatenate([c[key][metric].reshape(len(c[key][metric]), -1) for c in chunks])
+            values = np.where(np.isinf(values), np.nan, values)
+            with np.errstate(invalid='ignore'), warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN columns (groups never observed)
+                lo, hi = np.nanpercentile(values, [100 * alpha, 100 * (1 - alpha)], axis=0)
+            intervals[key][metric] = (lo, hi)
+    return intervals
+
+
+def add_intervals_to_report(report, intervals, resamples, confidence, seed, attributes=SYNTHETIC_ATTRIBUTES):
+    """Attach [lo, hi] pairs as 'ci' to every group entry (and the overall and legacy parity numbers)."""
+    def pair(bounds, i=0):
+        return [_num(bounds[0][i]), _num(bounds[1][i])]
+
+    report['bootstrap'] = {'resamples': resamples, 'confidence': confidence, 'seed': seed, 'method': 'percentile'}
+    report['overall_ci'] = {metric: pair(bounds) for metric, bounds in intervals['overall'].items()}
+    for key, ci in intervals.items():
+        if key == 'overall':
+            continue
+        names = (key,) if isinstance(key, str) else key
+        block = report['attributes' if len(names) == 1 else 'intersections'].get('&'.join(names))
+        if block is None:
+            continue
+        group_names = intersection_names([attributes[n][0] for n in names])
+        for gname, entry in block['groups'].items():
+            i = group_names.index(gname)
+            entry['ci'] = {metric: pair(bounds, i) for metric, bounds in ci.items()}
+    if 'per_team' in report and 'team' in intervals:
+        teams = attributes['team'][0]
+        for gname, entry in report['per_team'].items():
+            entry['ci'] = {m: pair(intervals['team'][m], teams.index(gname)) for m in ('accuracy', 'f1_macro')}
+        # the legacy parity block compares LEGACY_UNPRIVILEGED_TEAM with the privileged team
+        i = teams.index(LEGACY_UNPRIVILEGED_TEAM)
+        report['parity']['statistical_parity_difference_ci'] = pair(intervals['team']['statistical_parity_difference'], i)
+        report['parity']['disparate_impact_ci'] = pair(intervals['team']['disparate_impact'], i)
+    return report
+
+
+def aif360_team_metrics(X, team_codes, y_true_bin, y_pred_bin):
+    # cross-check of the team parity numbers with AIF360 (optional dependency)
+    groups = SYNTHETIC_ATTRIBUTES['team'][0]
+    df = X.copy()
+    df['team'] = team_codes
+    df['label'] = y_true_bin
+    dataset_true = BinaryLabelDataset(df=df, label_names=['label'], protected_attribute_names=['team'], favorable_label=1)
+    df_pred = df.copy()
+    df_pred['label'] = y_pred_bin
+    dataset_pred = BinaryLabelDataset(df=df_pred, label_names=['label'], protected_attribute_names=['team'], favorable_label=1)
+    cm = ClassificationMetric(dataset_true, dataset_pred,
+                              unprivileged_groups=[{'team': groups.index(LEGACY_UNPRIVILEGED_TEAM)}],
+                              privileged_groups=[{'team': groups.index(PRIVILEGED_GROUPS['team'])}])
+    return {
+        'statistical_parity_difference': cm.statistical_parity_difference(),
+        'disparate_impact': cm.disparate_impact(),
+    }
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Vectorized multi-attribute fairness audit of model.pkl.')
+    parser.add_argument('--model', default='model.pkl')
+    parser.add_argument('--rows', type=int, default=None, help='resample the dataset to this many rows (default: all rows once)')
+    parser.add_argument('--max-order', type=int, default=2, help='largest intersection of attributes to report')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--bootstrap', type=int, default=0, metavar='N', help='add confidence intervals from N resamples')
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--workers', type=int, default=None, help='processes for --bootstrap (default: all cores)')
+    parser.add_argument('--output', default='fairness_report.json')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
     data = load_breast_cancer(as_frame=True)
     X = data.frame.drop(columns=['target'])
-    model_bundle = joblib.load('model.pkl')
+    model_bundle = joblib.load(args.model)
     pipe = model_bundle['pipeline']
-    inv_label_map = {v:k for k,v in model_bundle['label_map'].items()}
-
-    # create synthetic test set
-    X_test = X.sample(200, random_state=42)
-    teams = synthesize_team(len(X_test))
-    # -- synthesize true priority labels using same logic as training --
-    # Here we reuse 'mean radius' thresholds to create low/medium/high labels
-    scores = X_test['mean radius']
-    q1 = np.percentile(X['mean radius'], 33)
-    q2 = np.percentile(X['mean radius'], 66)
-    def map_priority_val(x):
-        if x <= q1:
-            return 'low'
-        elif x <= q2:
-            return 'medium'
-        else:
-            return 'high'
-    y_true_names = scores.apply(map_priority_val)
-    label_map = model_bundle.get('label_map', {'low':0,'medium':1,'high':2})
-    inv_label_map = {v:k for k,v in label_map.items()}
-    y_true_enc = y_true_names.map(label_map)
-
-    # predictions
-    y_pred_enc = pipe.predict(X_test)
-    y_pred_names = [inv_label_map[int(v)] for v in y_pred_enc]
-
-    # binary versions (high vs not-high) for parity metrics
-    y_true_bin = np.array([1 if n=='high' else 0 for n in y_true_names])
-    y_pred_bin = np.array([1 if n=='high' else 0 for n in y_pred_names])
-
-    report = {}
-    report['overall_accuracy'] = float(accuracy_score(y_true_enc, y_pred_enc))
-
-    # per-team performance: compare true vs predicted
-    team_metrics = {}
-    for t in np.unique(teams):
-        idx = np.where(teams==t)[0]
-        if len(idx)==0:
-            continue
-        y_t = y_true_enc.iloc[idx]
-        y_p = y_pred_enc[idx]
-        acc = accuracy_score(y_t, y_p)
-        f1 = f1_score(y_t, y_p, average='macro')
-        team_metrics[t] = {'accuracy': float(acc), 'f1_macro': float(f1), 'support': int(len(idx))}
-    report['per_team'] = team_metrics
+    label_map = model_bundle.get('label_map', {'low': 0, 'medium': 1, 'high': 2})
 
-    if AIF360_AVAILABLE:
-        # create BinaryLabelDataset using true labels as 'label' and attach predictions as scores
-        df = X_test.copy()
-        df['team'] = teams
-        df['label'] = y_true_bin
-        df['score'] = y_pred_bin
-        # BinaryLabelDataset expects protected attribute(s) as numeric or categorical columns
-        dataset_true = BinaryLabelDataset(df=df, label_names=['label'], protected_attribute_names=['team'], favorable_label=1)
-        # To compute classification metric, we need a dataset with predicted labels as 'score' or label; create a copy with predicted label
-        df_pred = df.copy()
-        df_pred['label'] = df['score']
-        dataset_pred = BinaryLabelDataset(df=df_pred, label_names=['label'], protected_attribute_names=['team'], favorable_label=1)
-        cm = ClassificationMetric(dataset_true, dataset_pred, unprivileged_groups=[{'team':'team_C'}], privileged_groups=[{'team':'team_A'}])
-        report['aif360'] = {
-            'statistical_parity_difference': cm.statistical_parity_difference(),
-            'disparate_impact': cm.disparate_impact()
-        }
+    X_audit = X if args.rows is None else X.iloc[rng.integers(0, len(X), args.rows)].reset_index(drop=True)
+    start = time.perf_counter()
+    # true labels from the same 'mean radius' thresholds as training, as indices into LABEL_NAMES
+    y_true = priority_labels(X_audit['mean radius'].to_numpy(), X['mean radius'].to_numpy())
+    # predictions are the model's encoded labels; map them to LABEL_NAMES indices
+    enc_to_index = np.zeros(max(label_map.values()) + 1, dtype=np.int64)
+    for name, enc in label_map.items():
+        enc_to_index[enc] = LABEL_NAMES.index(name)
+    y_pred = enc_to_index[np.asarray(pipe.predict(X_audit), dtype=np.int64)]
+    predict_seconds = time.perf_counter() - start
 
-    # -- manual parity metrics (works without AIF360) --
-    # compute group positive rates (P(Y_hat=1 | group)) for teams
-    df_pr = pd.DataFrame({'team': teams, 'y_true_bin': y_true_bin, 'y_pred_bin': y_pred_bin})
-    group_rates = df_pr.groupby('team')['y_pred_bin'].mean().to_dict()
-    # reference (privileged) group is team_A by convention
-    priv_rate = float(group_rates.get('team_A', 0.0))
-    unpriv_rate = float(group_rates.get('team_C', 0.0))
-    # statistical parity difference = unprivileged - privileged
-    spd = unpriv_rate - priv_rate
-    # disparate impact = unprivileged / privileged (guard divide-by-zero)
-    di = (unpriv_rate / priv_rate) if priv_rate > 0 else None
-    report['parity'] = {
-        'group_positive_rate': {k: float(v) for k,v in group_rates.items()},
-        'statistical_parity_difference': float(spd),
-        'disparate_impact': (float(di) if di is not None else None)
-    }
+    start = time.perf_counter()
+    codes = synthesize_attributes(len(X_audit), rng)
+    overall_cm = confusion_by_group(np.zeros(len(y_true), dtype=np.int64), y_true, y_pred, 1, len(LABEL_NAMES))[0]
+    report = audit_from_confusion(overall_cm, attribute_confusions(codes, y_true, y_pred, max_order=args.max_order),
+                                  max_order=args.max_order)
+    audit_seconds = time.perf_counter() - start
 
-    with open('fairness_report.json', 'w', encoding='utf-8') as f:
+    if args.bootstrap:
+        start = time.perf_counter()
+        intervals = bootstrap_intervals(codes, y_true, y_pred, args.bootstrap, args.confidence, args.seed,
+                                        args.workers, max_order=args.max_order)
+        add_intervals_to_report(report, intervals, args.bootstrap, args.confidence, args.seed)
+        print(f'Bootstrap: {args.bootstrap} resamples in {time.perf_counter() - start:.2f}s')
+
+    if AIF360_AVAILABLE:
+        positive = LABEL_NAMES.index(POSITIVE_LABEL)
+        report['aif360'] = aif360_team_metrics(X_audit, codes['team'], (y_true == positive).astype(int),
+                                               (y_pred == positive).astype(int))
+
+    report['config'] = {'model': args.model, 'rows': len(X_audit), 'seed': args.seed, 'max_order': args.max_order,
+                        'attributes': {n: g for n, (g, _) in SYNTHETIC_ATTRIBUTES.items()}}
+    with open(args.output, 'w', encoding='utf-8') as f:
         json.dump(report, f, indent=2)
-    print('Wrote fairness_report.json')
+    print(f'Audited {len(X_audit)} rows ({len(report["attributes"])} attributes, {len(report["intersections"])} intersections): '
+          f'predict {predict_seconds:.2f}s, metrics {audit_seconds:.3f}s')
+    print(f'Wrote {args.output}')
+
 
 if __name__ == '__main__':
     main()
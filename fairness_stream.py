@@ -0,0 +1,285 @@
+"""
+fairness_stream.py
+
+Incremental fairness audit over what the live service actually predicted, read from prediction_logs.csv.
+
+The log is read from the byte offset where the last run stopped, in chunks of at most `--chunk-bytes`. Only complete
+lines are consumed, so a row the app is still appending is picked up next time. Each chunk is parsed into arrays and
+folded into per-group confusion counts with fairness_audit.confusion_by_group. The counts are all the state there is:
+memory stays constant however long the log grows. After every chunk the counts and the offset go to a checkpoint file,
+and a fresh fairness_report.json is rendered from the counts alone with fairness_audit.audit_from_confusion, without
+rescanning the log. Both files are written atomically (temp file + rename). A restart resumes from the checkpoint. A
+log that shrank below the saved offset (rotated or truncated) is audited again from the start.
+
+True labels come from the logged features with the training rule: 'mean radius' against the 33rd/66th percentiles of
+the dataset, frozen in the checkpoint. The log has no protected attributes, so:
+- `login_status` (anonymous/authenticated) comes from the logged user;
+- the synthetic `team`, `region` and `seniority` of fairness_audit.py are derived from a hash of the user name (of the
+  features for anonymous rows).
+That keeps every row in the same groups across runs and restarts.
+
+With the columnar log (PREDICTION_LOG_FORMAT=columnar, or --log pointing at a segment directory) sealed segments are
+read through prediction_log.ColumnarLogReader instead, and the checkpoint keeps the name of the last segment audited in
+place of a byte offset. Rows still in a worker's open segment are audited once it is sealed. Anonymous rows hash their
+feature values, so they can land in other groups than in the CSV log (which hashes the raw JSON text).
+
+Usage:
+  python fairness_stream.py                     # process what's new, write the report, exit
+  python fairness_stream.py --follow --interval 10
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from fairness_audit import (LABEL_NAMES, SYNTHETIC_ATTRIBUTES, attribute_confusions, audit_from_confusion,
+                            confusion_by_group)
+from prediction_log import ColumnarLogReader
+
+STREAM_ATTRIBUTES = dict(SYNTHETIC_ATTRIBUTES, login_status=(['anonymous', 'authenticated'], None))
+# attributes drawn from the row hash, each from its own 4 bytes of one blake2b digest
+HASHED_ATTRIBUTES = list(SYNTHETIC_ATTRIBUTES)
+
+CHECKPOINT_VERSION = 1
+
+
+def _cumulative(probs):
+    edges = np.cumsum(probs)
+    edges[-1] = 1.0
+    return edges
+
+
+_HASH_EDGES = {name: _cumulative(SYNTHETIC_ATTRIBUTES[name][1]) for name in HASHED_ATTRIBUTES}
+
+
+def reference_thresholds():
+    """33rd/66th percentiles of 'mean radius' over the dataset, as used for the training labels."""
+    from sklearn.datasets import load_breast_cancer
+    scores = load_breast_cancer(as_frame=True).frame['mean radius'].to_numpy()
+    return [float(np.percentile(scores, 33)), float(np.percentile(scores, 66))]
+
+
+def hashed_codes(keys):
+    """Codes of the HASHED_ATTRIBUTES for each row key (user name, or the features of anonymous rows)."""
+    uniforms = []
+    for key in keys:
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=4 * len(HASHED_ATTRIBUTES)).digest()
+        uniforms.append([int.from_bytes(digest[4 * i:4 * i + 4], 'little') / 2 ** 32 for i in range(len(HASHED_ATTRIBUTES))])
+    uniforms = np.array(uniforms, dtype=np.float64).reshape(len(keys), len(HASHED_ATTRIBUTES))
+    return {name: np.searchsorted(_HASH_EDGES[name], uniforms[:, i], side='right')
+            for i, name in enumerate(HASHED_ATTRIBUTES)}
+
+
+def parse_rows(lines, thresholds):
+    """Arrays (y_true, y_pred, attribute codes) for the parseable CSV lines, plus the number of rows skipped."""
+    y_true, y_pred, login, keys = [], [], [], []
+    skipped = 0
+    label_index = {name: i for i, name in enumerate(LABEL_NAMES)}
+    for row in csv.reader(lines):
+        try:
+            _, user, pred, features_json = row
+            features = json.loads(features_json)
+            radius = float(features['mean radius'])
+            pred_index = label_index[pred]
+        except (ValueError, KeyError, TypeError):
+            skipped += 1
+            continue
+        keys.append(user if user else features_json)
+        y_true.append(radius)
+        y_pred.append(pred_index)
+        login.append(1 if user else 0)
+    y_true = np.digitize(np.array(y_true, dtype=np.float64), thresholds, right=True)
+    codes = hashed_codes(keys)
+    codes['login_status'] = np.array(login, dtype=np.int64)
+    return y_true, np.array(y_pred, dtype=np.int64), codes, skipped
+
+
+def parse_segment(segment, thresholds):
+    """Like parse_rows, for one columnar log segment (see prediction_log.ColumnarLogReader)."""
+    names = segment['feature_names']
+    if 'mean radius' not in names:
+        return parse_rows([], thresholds)[:3] + (segment['rows'],)
+    label_index = {name: i for i, name in enumerate(LABEL_NAMES)}
+    label_codes = np.array([label_index.get(label, -1) for label in segment['labels']], dtype=np.int64)
+    y_pred = label_codes[np.asarray(segment['label_codes'], dtype=np.int64)]
+    keep = y_pred >= 0
+    features = np.asarray(segment['features'])[keep]
+    users = np.asarray(segment['users'], dtype=object)[np.asarray(segment['user_codes'])[keep]]
+    radius = features[:, names.index('mean radius')].astype(np.float64)
+    keys = [user if user else json.dumps(dict(zip(names, row.tolist()))) for user, row in zip(users, features)]
+    codes = hashed_codes(keys)
+    codes['login_status'] = (users != '').astype(np.int64)
+    return (np.digitize(radius, thresholds, right=True), y_pred[keep], codes, int((~keep).sum()))
+
+
+class StreamingAudit:
+    """Confusion counts for the overall population and every attribute/intersection, plus the log position."""
+
+    def __init__(self, log_path, thresholds, max_order=2):
+        self.log_path = log_path
+        self.thresholds = thresholds
+        self.max_order = max_order
+        self.reset()
+
+    @property
+    def columnar(self):
+        return os.path.isdir(self.log_path)
+
+    def reset(self):
+        self.offset = 0
+        self.last_segment = None
+        self.rows = 0
+        self.skipped = 0
+        self.overall = np.zeros((len(LABEL_NAMES), len(LABEL_NAMES)), dtype=np.int64)
+        self.counts = {}
+
+    def add(self, y_true, y_pred, codes, skipped=0):
+        self.rows += len(y_true)
+        self.skipped += skipped
+        if not len(y_true):
+            return
+        self.overall += confusion_by_group(np.zeros(len(y_true), dtype=np.int64), y_true, y_pred, 1, len(LABEL_NAMES))[0]
+        for key, cm in attribute_confusions(codes, y_true, y_pred, STREAM_ATTRIBUTES, self.max_order).items():
+            if key in self.counts:
+                self.counts[key] += cm
+            else:
+                self.counts[key] = cm
+
+    def process_available(self, chunk_bytes=8 * 1024 * 1024):
+        """Consume complete lines appended since `offset`, one chunk at a time; yields bytes consumed after each chunk.
+        For a columnar log directory, consume the sealed segments after `last_segment`; yields 1 per segment."""
+        if self.columnar:
+            for segment in ColumnarLogReader(self.log_path).iter_segments(after=self.last_segment):
+                self.add(*parse_segment(segment, self.thresholds))
+                self.last_segment = segment['name']
+                yield 1
+            return
+        try:
+            size = os.path.getsize(self.log_path)
+        except OSError:
+            return
+        if size < self.offset:
+            print(f'{self.log_path} shrank below the checkpoint offset; auditing it again from the start', flush=True)
+            self.reset()
+        with open(self.log_path, 'rb') as f:
+            f.seek(self.offset)
+            while True:
+                data = f.read(chunk_bytes)
+                end = data.rfind(b'\n') + 1
+                if end == 0:
+                    # no complete line (yet); a single line longer than chunk_bytes is read whole
+                    if len(data) == chunk_bytes:
+                        data += f.readline()
+                        end = len(data) if data.endswith(b'\n') else 0
+                    if end == 0:
+                        return
+                lines = data[:end].decode('utf-8', errors='replace').splitlines()
+                self.add(*parse_rows(lines, self.thresholds))
+                self.offset += end
+                f.seek(self.offset)
+                yield end
+
+    def report(self):
+        report = audit_from_confusion(self.overall, self.counts, STREAM_ATTRIBUTES, self.max_order)
+        report['stream'] = {
+            'log_path': self.log_path,
+            'offset': self.offset,
+            'last_segment': self.last_segment,
+            'rows': self.rows,
+            'skipped_rows': self.skipped,
+            'thresholds': self.thresholds,
+            'updated_at': datetime.now(timezone.utc).isoformat(),
+        }
+        return report
+
+    def to_checkpoint(self):
+        return {
+            'version': CHECKPOINT_VERSION,
+            'log_path': self.log_path,
+            'offset': self.offset,
+            'last_segment': self.last_segment,
+            'rows': self.rows,
+            'skipped': self.skipped,
+            'thresholds': self.thresholds,
+            'max_order': self.max_order,
+            'overall': self.overall.tolist(),
+            'counts': [[[key] if isinstance(key, str) else list(key), cm.tolist()] for key, cm in self.counts.items()],
+        }
+
+    @classmethod
+    def from_checkpoint(cls, state):
+        audit = cls(state['log_path'], state['thresholds'], state['max_order'])
+        audit.offset = state['offset']
+        audit.last_segment = state.get('last_segment')
+        audit.rows = state['rows']
+        audit.skipped = state['skipped']
+        audit.overall = np.array(state['overall'], dtype=np.int64)
+        audit.counts = {names[0] if len(names) == 1 else tuple(names): np.array(cm, dtype=np.int64)
+                        for names, cm in state['counts']}
+        return audit
+
+
+def write_json_atomic(path, obj):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, indent=2)
+    os.replace(tmp, path)
+
+
+def load_audit(checkpoint_path, log_path, max_order):
+    """Resume from the checkpoint when it belongs to the same log and settings, else start from offset 0."""
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if (state.get('version') == CHECKPOINT_VERSION and state.get('log_path') == log_path
+                and state.get('max_order') == max_order):
+            return StreamingAudit.from_checkpoint(state)
+        print(f'Checkpoint {checkpoint_path} is for another log or settings; starting over', flush=True)
+    return StreamingAudit(log_path, reference_thresholds(), max_order)
+
+
+def run_once(audit, checkpoint_path, report_path, chunk_bytes):
+    """Process everything appended so far; checkpoint and report after each chunk (or segment). Returns bytes (or
+    segments) consumed."""
+    consumed = 0
+    for n in audit.process_available(chunk_bytes):
+        consumed += n
+        write_json_atomic(checkpoint_path, audit.to_checkpoint())
+        write_json_atomic(report_path, audit.report())
+    return consumed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Incremental fairness audit over prediction_logs.csv.')
+    default_log = 'prediction_logs' if os.environ.get('PREDICTION_LOG_FORMAT') == 'columnar' else 'prediction_logs.csv'
+    parser.add_argument('--log', default=os.environ.get('PREDICTION_LOG_PATH', default_log),
+                        help='CSV prediction log, or a columnar log directory')
+    parser.add_argument('--checkpoint', default='fairness_stream_checkpoint.json')
+    parser.add_argument('--output', default='fairness_report.json')
+    parser.add_argument('--max-order', type=int, default=2)
+    parser.add_argument('--chunk-bytes', type=int, default=8 * 1024 * 1024)
+    parser.add_argument('--follow', action='store_true', help='keep tailing the log')
+    parser.add_argument('--interval', type=float, default=10.0, help='seconds between polls with --follow')
+    args = parser.parse_args()
+
+    audit = load_audit(args.checkpoint, args.log, args.max_order)
+    consumed = run_once(audit, args.checkpoint, args.output, args.chunk_bytes)
+    if not consumed:
+        write_json_atomic(args.output, audit.report())
+    unit = 'segments' if audit.columnar else 'bytes'
+    print(f'Audited {audit.rows} logged predictions ({audit.skipped} skipped), {consumed} new {unit}; wrote {args.output}',
+          flush=True)
+    while args.follow:
+        time.sleep(args.interval)
+        if run_once(audit, args.checkpoint, args.output, args.chunk_bytes):
+            position = f'segment {audit.last_segment}' if audit.columnar else f'offset {audit.offset}'
+            print(f'{audit.rows} predictions audited ({position})', flush=True)
+
+
+if __name__ == '__main__':
+    main()
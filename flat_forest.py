@@ -0,0 +1,324 @@
+"""
+flat_forest.py
+
+Array-based evaluator for the priority model. It predicts straight from packed NumPy arrays,
+without sklearn's per-call input validation and per-tree dispatch.
+
+`export_flat_forest` takes a saved model.pkl (StandardScaler + RandomForestClassifier or a
+single DecisionTreeClassifier). It folds the scaler into every split threshold and writes the
+trees as flat arrays into a directory. Each file can be loaded memory-mapped:
+
+  feature.npy    int32    split feature per node (0 for leaves)
+  threshold.npy  float64  split threshold on the *raw* feature value
+  left.npy       int32    global index of the left child (leaves point to themselves)
+  right.npy      int32    global index of the right child (leaves point to themselves)
+  proba.npy      float64  per-node class probabilities, exactly as the tree's predict_proba returns them
+  roots.npy      int32    root node index of each tree
+  meta.json      model version (sha256 prefix of model.pkl, as app.py computes it), classes,
+                 depth, feature names and label map; written last, so a directory without it
+                 is incomplete and is never loaded
+
+Folding is exact, not approximate. sklearn sends a row left when
+float32((x - mean) / scale) <= t, and that predicate is monotone in x. For every node, a
+vectorized bisection over the ordered float64 bit patterns finds the largest raw x for which
+it holds. `x <= folded` then agrees with the scaled test for every finite input. Probabilities
+are summed tree by tree in the same order sklearn uses (a cumulative sum, not a pairwise
+sum), then divided by the tree count. So `FlatForest.predict` returns the same classes as
+`Pipeline.predict`, and the export checks this on the given data before writing meta.json.
+
+Usage:
+  python flat_forest.py export model.pkl flat_model
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+
+import joblib
+import numpy as np
+
+META_FILE = 'meta.json'
+ARRAYS = ('feature', 'threshold', 'left', 'right', 'proba', 'roots')
+
+# rows per traversal chunk: bounds the (rows, trees, classes) temporaries for big batches
+_CHUNK_ROWS = 1024
+
+_SIGN_MASK = np.int64(0x7FFFFFFFFFFFFFFF)
+_DBL_MAX = np.finfo(np.float64).max
+
+
+def _ordered_keys(x):
+    # float64 -> int64 whose integer order equals the float order (-0.0 and 0.0 stay adjacent)
+    bits = np.ascontiguousarray(x, dtype=np.float64).view(np.int64)
+    return np.where(bits < 0, bits ^ _SIGN_MASK, bits)
+
+
+def _from_ordered_keys(keys):
+    bits = np.where(keys < 0, keys ^ _SIGN_MASK, keys)
+    return bits.view(np.float64)
+
+
+def _goes_left(x, mean, scale, threshold):
+    # sklearn's split test on a raw value: StandardScaler arithmetic in float64, then the tree's float32 input
+    # the probes span the whole float64 range, so overflow to +-inf is expected (and is what sklearn would compute)
+    with np.errstate(over='ignore'):
+        z = x - mean if mean is not None else x.copy()
+        if scale is not None:
+            z /= scale
+        z32 = z.astype(np.float32)
+    return z32.astype(np.float64) <= threshold
+
+
+def fold_thresholds(feature, threshold, mean=None, scale=None):
+    """Raw-space thresholds: for each split, the largest float64 x with float32((x - mean[f]) / scale[f]) <= t.
+    -inf when no finite x goes left, +inf when every finite x does."""
+    m = mean[feature] if mean is not None else None
+    s = scale[feature] if scale is not None else None
+    lo = np.full(len(feature), -_DBL_MAX)
+    hi = np.full(len(feature), _DBL_MAX)
+    low_left = _goes_left(lo, m, s, threshold)
+    high_left = _goes_left(hi, m, s, threshold)
+    lo_k, hi_k = _ordered_keys(lo), _ordered_keys(hi)
+    # invariant where both ends differ: lo goes left, hi goes right; 64 halvings close any int64 interval
+    for _ in range(64):
+        mid_k = (lo_k >> 1) + (hi_k >> 1) + (lo_k & hi_k & 1)
+        left = _goes_left(_from_ordered_keys(mid_k), m, s, threshold)
+        lo_k = np.where(left, mid_k, lo_k)
+        hi_k = np.where(left, hi_k, mid_k)
+    folded = _from_ordered_keys(lo_k)
+    folded = np.where(high_left, np.inf, folded)
+    folded = np.where(low_left, folded, -np.inf)
+    # the bisection result is exact: it goes left and the next float up does not
+    inner = low_left & ~high_left
+    m_in = m[inner] if m is not None else None
+    s_in = s[inner] if s is not None else None
+    t_in = threshold[inner]
+    if not (_goes_left(folded[inner], m_in, s_in, t_in).all()
+            and not _goes_left(np.nextafter(folded[inner], np.inf), m_in, s_in, t_in).any()):
+        raise AssertionError('threshold folding is not exact')
+    return folded
+
+
+def _leaf_proba(tree_estimator):
+    # per-node class probabilities computed the way DecisionTreeClassifier.predict_proba does
+    import sklearn
+    value = np.array(tree_estimator.tree_.value[:, 0, :tree_estimator.n_classes_], dtype=np.float64)
+    major, minor = (int(p) for p in sklearn.__version__.split('.')[:2])
+    if (major, minor) < (1, 4):
+        # older releases store weighted counts and normalize them per call
+        normalizer = value.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        value /= normalizer
+    return value
+
+
+def flatten_pipeline(pipe):
+    """Packed arrays (dict) and classes for a fitted scaler + forest/tree pipeline, thresholds folded to raw space."""
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.tree import DecisionTreeClassifier
+    if isinstance(pipe, Pipeline) and len(pipe.steps) == 2 and isinstance(pipe.steps[0][1], StandardScaler):
+        scaler, model = pipe.steps[0][1], pipe.steps[1][1]
+        mean = scaler.mean_ if scaler.with_mean else None
+        scale = scaler.scale_ if scaler.with_std else None
+    else:
+        mean = scale = None
+        model = pipe.steps[-1][1] if isinstance(pipe, Pipeline) and len(pipe.steps) == 1 else pipe
+    if isinstance(model, RandomForestClassifier):
+        trees = model.estimators_
+    elif isinstance(model, DecisionTreeClassifier):
+        trees = [model]
+    else:
+        raise TypeError(f'cannot flatten {type(model).__name__}; expected a StandardScaler + RandomForestClassifier/DecisionTreeClassifier pipeline')
+    if model.n_outputs_ != 1:
+        raise TypeError('only single-output classifiers can be flattened')
+
+    features, thresholds, lefts, rights, probas, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for tree in trees:
+        t = tree.tree_
+        n = t.node_count
+        node_ids = np.arange(n, dtype=np.int64)
+        is_leaf = t.children_left == -1
+        features.append(np.where(is_leaf, 0, t.feature).astype(np.int32))
+        thresholds.append(np.where(is_leaf, 0.0, t.threshold))
+        lefts.append((np.where(is_leaf, node_ids, t.children_left) + offset).astype(np.int32))
+        rights.append((np.where(is_leaf, node_ids, t.children_right) + offset).astype(np.int32))
+        probas.append(_leaf_proba(tree))
+        roots.append(offset)
+        max_depth = max(max_depth, t.max_depth)
+        offset += n
+    if offset >= 2 ** 31:
+        raise ValueError('forest too large for int32 node indices')
+
+    feature = np.concatenate(features)
+    threshold = np.concatenate(thresholds)
+    left = np.concatenate(lefts)
+    right = np.concatenate(rights)
+    split = left != np.arange(offset)
+    folded = threshold.copy()
+    folded[split] = fold_thresholds(feature[split], threshold[split], mean, scale)
+    arrays = {
+        'feature': feature,
+        'threshold': folded,
+        'left': left,
+        'right': right,
+        'proba': np.concatenate(probas),
+        'roots': np.array(roots, dtype=np.int32),
+    }
+    return arrays, model.classes_, max_depth
+
+
+class FlatForest:
+    """Predicts from an exported directory; arrays are memory-mapped read-only by default."""
+
+    def __init__(self, directory, mmap=True):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        mode = 'r' if mmap else None
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mode))
+        self.classes = np.array(self.meta['classes'])
+        self.max_depth = int(self.meta['max_depth'])
+        self.model_version = self.meta['model_version']
+        self.feature_names = self.meta['feature_names']
+        self.label_map = self.meta.get('label_map')
+
+    @classmethod
+    def from_arrays(cls, arrays, classes, max_depth, meta=None):
+        self = cls.__new__(cls)
+        self.directory = None
+        self.meta = meta or {}
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.classes = np.asarray(classes)
+        self.max_depth = int(max_depth)
+        self.model_version = self.meta.get('model_version')
+        self.feature_names = self.meta.get('feature_names')
+        self.label_map = self.meta.get('label_map')
+        return self
+
+    def leaves(self, X):
+        """(rows, trees) leaf node indices; all trees advance together and leaves loop onto themselves."""
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        rows = np.arange(len(X))[:, None]
+        feature, threshold, left, right = self.feature, self.threshold, self.left, self.right
+        for _ in range(self.max_depth):
+            go_left = X[rows, feature[nodes]] <= threshold[nodes]
+            nodes = np.where(go_left, left[nodes], right[nodes])
+        return nodes
+
+    def predict_proba(self, X):
+        """Mean class probabilities over trees, matching RandomForestClassifier.predict_proba bit for bit."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or (self.feature_names is not None and X.shape[1] != len(self.feature_names)):
+            raise ValueError(f'expected a 2-D array with one column per feature, got shape {X.shape}')
+        if not np.isfinite(X).all():
+            raise ValueError('Input contains NaN or infinity')
+        out = np.empty((len(X), self.proba.shape[1]))
+        n_trees = len(self.roots)
+        for start in range(0, len(X), _CHUNK_ROWS):
+            chunk = X[start:start + _CHUNK_ROWS]
+            per_tree = self.proba[self.leaves(chunk)]
+            # sequential sum in tree order, like the forest's accumulate loop (np.sum would add pairwise)
+            out[start:start + len(chunk)] = np.cumsum(per_tree, axis=1)[:, -1] / n_trees
+        return out
+
+    def predict(self, X):
+        """Encoded class labels (the estimator's classes_), like Pipeline.predict."""
+        return self.classes.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+def model_file_version(path):
+    """Content hash app.py uses as the model version (see app.read_model_bundle)."""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def export_flat_forest(model_path, out_dir, X=None):
+    """Flatten the pipeline in `model_path` into `out_dir` and return the meta dict.
+    If `X` (rows in training feature order) is given, it raises unless the flat predictions equal
+    Pipeline.predict on every row. That check runs before meta.json is written."""
+    with open(model_path, 'rb') as f:
+        data = f.read()
+    raw = joblib.load(io.BytesIO(data))
+    pipe = raw.get('pipeline') if isinstance(raw, dict) else raw
+    feature_names = raw.get('feature_names') if isinstance(raw, dict) else None
+    if feature_names is None:
+        feature_names = [str(n) for n in getattr(pipe, 'feature_names_in_', [])] or None
+    arrays, classes, max_depth = flatten_pipeline(pipe)
+    meta = {
+        'model_version': hashlib.sha256(data).hexdigest()[:12],
+        'model_path': os.path.basename(model_path),
+        'n_trees': int(len(arrays['roots'])),
+        'n_nodes': int(len(arrays['feature'])),
+        'max_depth': int(max_depth),
+        'classes': classes.tolist(),
+        'feature_names': feature_names,
+        'label_map': raw.get('label_map') if isinstance(raw, dict) else None,
+    }
+    flat = FlatForest.from_arrays(arrays, classes, max_depth, meta)
+    if X is not None:
+        X = np.asarray(X, dtype=np.float64)
+        expected = pipe.predict(_as_frame(X, feature_names))
+        got = flat.predict(X)
+        mismatches = int((np.asarray(expected) != got).sum())
+        if mismatches:
+            raise AssertionError(f'flat evaluator disagrees with the pipeline on {mismatches} of {len(X)} rows')
+        meta['verified_rows'] = int(len(X))
+
+    os.makedirs(out_dir, exist_ok=True)
+    meta_path = os.path.join(out_dir, META_FILE)
+    if os.path.exists(meta_path):
+        # an older export is no longer complete while its arrays are being replaced
+        os.remove(meta_path)
+    for name in ARRAYS:
+        np.save(os.path.join(out_dir, f'{name}.npy'), arrays[name])
+    with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(meta_path + '.tmp', meta_path)
+    return meta
+
+
+def load_flat_forest(directory, model_version=None, mmap=True):
+    """The exported FlatForest in `directory`, or None if it is missing, incomplete or built from another model version."""
+    if not directory or not os.path.exists(os.path.join(directory, META_FILE)):
+        return None
+    flat = FlatForest(directory, mmap=mmap)
+    if model_version is not None and flat.model_version != model_version:
+        return None
+    return flat
+
+
+def _as_frame(X, feature_names):
+    if feature_names is None:
+        return X
+    import pandas as pd
+    return pd.DataFrame(X, columns=feature_names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export model.pkl to a flat array-based tree evaluator.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    exp = sub.add_parser('export', help='flatten a model and verify it on the breast-cancer dataset')
+    exp.add_argument('model', nargs='?', default='model.pkl')
+    exp.add_argument('out_dir', nargs='?', default='flat_model')
+    exp.add_argument('--no-verify', action='store_true')
+    args = parser.parse_args()
+
+    X = None
+    if not args.no_verify:
+        from sklearn.datasets import load_breast_cancer
+        X = load_breast_cancer(as_frame=True).frame.drop(columns=['target']).to_numpy(dtype=np.float64)
+    meta = export_flat_forest(args.model, args.out_dir, X)
+    print(f"Exported {meta['n_trees']} trees ({meta['n_nodes']} nodes, depth {meta['max_depth']}) "
+          f"for model version {meta['model_version']} to {args.out_dir}"
+          + (f"; verified on {meta['verified_rows']} rows" if 'verified_rows' in meta else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+"""gunicorn.conf.py
+
+Gunicorn settings for the web service (used by Procfile and render.yaml).
+Imports app.py in the master before forking so the model is loaded and warmed once
+(see app.preload_model) and its memory is shared copy-on-write by all workers.
+Worker count and bind address still come from WEB_CONCURRENCY and PORT.
+Workers are threaded (gthread, GUNICORN_THREADS per worker): password hashing runs on app.AUTH_POOL, which holds at
+most AUTH_HASH_WORKERS + AUTH_HASH_QUEUE threads per worker, so the remaining threads keep serving /predict during a
+burst of logins.
+"""
+import os
+
+# app.py calls preload_model() at import when this is set
+os.environ.setdefault('PRELOAD_MODEL', '1')
+
+preload_app = True
+
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '16'))
+
+
+def post_fork(server, worker):
+    server.log.info('Worker %s forked with the preloaded model', worker.pid)
+
+
+def worker_exit(server, worker):
+    # write out predictions still queued in this worker's logger
+    import app
+    app.PREDICTION_LOGGER.close()
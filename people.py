@@ -0,0 +1,224 @@
+"""
+people.py
+
+In-memory people dataset behind the index page and /api/people.
+
+PeopleDataset keeps a sorted permutation index per sortable field, built once when the dataset
+is created. A sorted page is then a slice of an index instead of a full sort per request.
+Ordering matches sort_dicts_by_key_inplace_safe over the records in insertion order: missing
+keys sort as `missing_value`, and ties keep insertion order in both directions. Adding or
+removing a record updates each index with a binary-search insert/delete rather than a rebuild.
+Records are treated as read-only once added; to change one, remove it and add the new version.
+
+generate_people_columns builds synthetic people as typed NumPy columns: ages are uint8, and the categorical
+fields are uint8 codes into the category lists below. Dicts are only created when a caller asks for them
+(PeopleColumns.to_dicts). Rows are generated in fixed blocks of GENERATION_BLOCK rows, each seeded by
+(seed, block index). So a seed always gives the same rows, whatever the chunking, and any slice can be generated
+on its own. iter_people_chunks and write_people stream millions of rows to NDJSON/CSV in bounded memory:
+
+  python people.py -n 1000000 --seed 42 --format csv -o people.csv
+"""
+import argparse
+import json
+import sys
+from bisect import bisect_left, insort
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+SORTABLE_FIELDS = ['age', 'grade', 'sex', 'nationality', 'race']
+
+NATIONALITIES = ['USA','UK','Canada','Nigeria','Kenya','India','China']
+RACES = ['Asian','Black','White','Hispanic','Other']
+SEXES = ['M','F']
+GRADE_BUCKETS = ['A','B','C','D','F']
+# categorical fields in record order, with their categories
+CATEGORIES = {'grade': GRADE_BUCKETS, 'sex': SEXES, 'nationality': NATIONALITIES, 'race': RACES}
+PEOPLE_FIELDS = ['name', 'age', 'grade', 'sex', 'nationality', 'race']
+AGE_RANGE = (10, 80)
+GENERATION_BLOCK = 65536
+
+
+class PeopleDataset:
+    def __init__(self, records: Iterable[Dict[str, Any]] = (), sortable_fields: Iterable[str] = SORTABLE_FIELDS,
+                 missing_value: Optional[Any] = None):
+        self.sortable_fields = list(sortable_fields)
+        self.missing_value = missing_value
+        # record id -> record, in insertion order (ids only grow, so id order is insertion order)
+        self._records: Dict[int, Dict[str, Any]] = {}
+        for record_id, record in enumerate(records):
+            self._records[record_id] = record
+        self._next_id = len(self._records)
+        # per field: ascending keys (value, id) and, for descending pages read from the end, (value, -id)
+        self._asc: Dict[str, List[tuple]] = {}
+        self._desc: Dict[str, List[tuple]] = {}
+        for field in self.sortable_fields:
+            mv = self.missing_value
+            values = [(rid, rec.get(field, mv)) for rid, rec in self._records.items()]
+            self._asc[field] = sorted((v, rid) for rid, v in values)
+            self._desc[field] = sorted((v, -rid) for rid, v in values)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def get(self, record_id: int) -> Dict[str, Any]:
+        return self._records[record_id]
+
+    def add(self, record: Dict[str, Any]) -> int:
+        """Add a record and return its id; each index is updated in O(log n) comparisons."""
+        record_id = self._next_id
+        self._next_id += 1
+        self._records[record_id] = record
+        for field in self.sortable_fields:
+            value = record.get(field, self.missing_value)
+            insort(self._asc[field], (value, record_id))
+            insort(self._desc[field], (value, -record_id))
+        return record_id
+
+    def remove(self, record_id: int) -> Dict[str, Any]:
+        """Remove and return the record with `record_id` (KeyError if unknown)."""
+        record = self._records.pop(record_id)
+        for field in self.sortable_fields:
+            value = record.get(field, self.missing_value)
+            _delete_key(self._asc[field], (value, record_id))
+            _delete_key(self._desc[field], (value, -record_id))
+        return record
+
+    def page(self, field: Optional[str] = None, reverse: bool = False, offset: int = 0, limit: int = 25) -> List[Dict[str, Any]]:
+        """Return `limit` records starting at `offset`, ordered by `field` (insertion order if None)."""
+        if offset < 0 or limit < 0:
+            raise ValueError('offset and limit must not be negative')
+        if field is None:
+            records = self._records.values()
+            if reverse:
+                records = reversed(records)
+            return list(islice(records, offset, offset + limit))
+        if field not in self._asc:
+            raise KeyError(f'{field!r} is not a sortable field; choose one of {self.sortable_fields}')
+        records = self._records
+        if not reverse:
+            return [records[rid] for _, rid in self._asc[field][offset:offset + limit]]
+        # descending = the (value, -id) index read backwards: value desc, then id asc
+        keys = self._desc[field]
+        stop = len(keys) - offset
+        if stop <= 0:
+            return []
+        start = max(0, stop - limit)
+        return [records[-neg_rid] for _, neg_rid in reversed(keys[start:stop])]
+
+
+def _delete_key(keys: List[tuple], key: tuple) -> None:
+    i = bisect_left(keys, key)
+    if i == len(keys) or keys[i] != key:
+        raise KeyError(key)
+    del keys[i]
+
+
+class PeopleColumns:
+    """Array-backed people rows [start, start + len): `age` plus a uint8 code column per categorical field;
+    row i is named 'Person {start + i + 1}'."""
+
+    def __init__(self, start: int, age, codes: Dict[str, Any]):
+        self.start = start
+        self.age = age
+        self.codes = codes
+
+    def __len__(self) -> int:
+        return len(self.age)
+
+    def column(self, field: str) -> List[Any]:
+        """Plain Python values of one field (category strings for categorical fields)."""
+        if field == 'name':
+            return [f'Person {i}' for i in range(self.start + 1, self.start + len(self) + 1)]
+        if field == 'age':
+            return self.age.tolist()
+        categories = CATEGORIES[field]
+        return [categories[c] for c in self.codes[field].tolist()]
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Records with the same schema as the index page's people."""
+        columns = [self.column(f) for f in PEOPLE_FIELDS]
+        return [dict(zip(PEOPLE_FIELDS, row)) for row in zip(*columns)]
+
+    def to_ndjson(self) -> str:
+        # category strings are JSON-encoded once; each row is one %-format of the already-encoded parts
+        template = '{"name": "Person %d", "age": %d, ' + ', '.join(f'"{f}": %s' for f in CATEGORIES) + '}\n'
+        encoded = [[json.dumps(c) for c in cats] for cats in CATEGORIES.values()]
+        columns = [range(self.start + 1, self.start + len(self) + 1), self.age.tolist()]
+        columns += [[enc[c] for c in self.codes[f].tolist()] for f, enc in zip(CATEGORIES, encoded)]
+        return ''.join(map(template.__mod__, zip(*columns)))
+
+    def to_csv(self) -> str:
+        # no category contains a comma or quote, so rows need no CSV quoting
+        template = 'Person %d,%d,' + ','.join(['%s'] * len(CATEGORIES)) + '\n'
+        columns = [range(self.start + 1, self.start + len(self) + 1), self.age.tolist()]
+        columns += [self.column(f) for f in CATEGORIES]
+        return ''.join(map(template.__mod__, zip(*columns)))
+
+
+def _generate_block(seed: int, block: int) -> Dict[str, Any]:
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(block,)))
+    out = {'age': rng.integers(AGE_RANGE[0], AGE_RANGE[1] + 1, GENERATION_BLOCK, dtype=np.uint8)}
+    for field, categories in CATEGORIES.items():
+        out[field] = rng.integers(0, len(categories), GENERATION_BLOCK, dtype=np.uint8)
+    return out
+
+
+def generate_people_columns(n: int, seed: int = 0, start: int = 0) -> PeopleColumns:
+    """Rows [start, start + n) of the synthetic people for `seed` as typed columns."""
+    if n < 0 or start < 0:
+        raise ValueError('n and start must not be negative')
+    parts = {'age': []}
+    parts.update({field: [] for field in CATEGORIES})
+    stop = start + n
+    for block in range(start // GENERATION_BLOCK, -(-stop // GENERATION_BLOCK)):
+        lo = max(start - block * GENERATION_BLOCK, 0)
+        hi = min(stop - block * GENERATION_BLOCK, GENERATION_BLOCK)
+        for field, values in _generate_block(seed, block).items():
+            parts[field].append(values[lo:hi])
+    empty = np.empty(0, dtype=np.uint8)
+    columns = {field: np.concatenate(values) if values else empty for field, values in parts.items()}
+    age = columns.pop('age')
+    return PeopleColumns(start, age, columns)
+
+
+def generate_people(n: int = 25, seed: int = 0) -> List[Dict[str, Any]]:
+    """n people as dicts (name, age, grade, sex, nationality, race)."""
+    return generate_people_columns(n, seed).to_dicts()
+
+
+def iter_people_chunks(n: int, seed: int = 0, chunk_size: int = GENERATION_BLOCK) -> Iterator[PeopleColumns]:
+    for start in range(0, n, chunk_size):
+        yield generate_people_columns(min(chunk_size, n - start), seed, start)
+
+
+def write_people(f, n: int, seed: int = 0, format: str = 'ndjson', chunk_size: int = GENERATION_BLOCK) -> int:
+    """Stream n generated people to a text file as NDJSON or CSV (with header); returns the row count."""
+    if format not in ('ndjson', 'csv'):
+        raise ValueError(f"format must be 'ndjson' or 'csv', got {format!r}")
+    if format == 'csv':
+        f.write(','.join(PEOPLE_FIELDS) + '\n')
+    for chunk in iter_people_chunks(n, seed, chunk_size):
+        f.write(chunk.to_ndjson() if format == 'ndjson' else chunk.to_csv())
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic people as NDJSON or CSV.')
+    parser.add_argument('-n', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+    parser.add_argument('--chunk-size', type=int, default=GENERATION_BLOCK)
+    parser.add_argument('-o', '--output', default=None, help='output file (default: stdout)')
+    args = parser.parse_args()
+    out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        write_people(out, args.n, args.seed, args.format, args.chunk_size)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+prediction_cache.py
+
+Bounded LRU cache of predictions for app.py, keyed on the model version plus a hash of the
+feature vector in training order. Clients that resend an identical payload (retries, dashboards
+polling the same record) get the stored label instead of another pass through every tree.
+Including the model version in the key means a reloaded model never serves stale entries.
+The cache is bounded both by entry count and by an estimate of its memory use; hit, miss and
+eviction counters in `stats()` show whether the limits fit the traffic.
+"""
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+
+# rough per-entry cost of the OrderedDict slot and key tuple, on top of the key/value objects
+_ENTRY_OVERHEAD = 160
+
+
+def feature_vector_key(model_version, row):
+    """Canonical cache key for one float64 feature row (training order); -0.0 and 0.0 hash the same."""
+    digest = hashlib.blake2b((row + 0.0).tobytes(), digest_size=16).digest()
+    return (model_version, digest)
+
+
+class PredictionCache:
+    def __init__(self, max_entries=10000, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = _entry_size(key, value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= _entry_size(key, old)
+            self._entries[key] = value
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                old_key, old_value = self._entries.popitem(last=False)
+                self._bytes -= _entry_size(old_key, old_value)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits / lookups) if lookups else None,
+            }
+
+
+def _entry_size(key, value):
+    version, digest = key
+    return _ENTRY_OVERHEAD + sys.getsizeof(version) + sys.getsizeof(digest) + sys.getsizeof(value)
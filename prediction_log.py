@@ -0,0 +1,560 @@
+"""
+prediction_log.py
+
+Buffered, non-blocking prediction logging used by app.py.
+
+Request threads only put records on an in-memory queue. A background thread appends them to
+prediction_logs.csv in batches, either when `batch_size` records are waiting or every
+`flush_interval` seconds. Each batch is written with a single append while holding an exclusive
+file lock, so rows from several gunicorn workers never interleave. Records that cannot be queued
+(queue full) or written (IO/encoding errors) are counted in `stats()` instead of being silently lost.
+The CSV layout is unchanged: timestamp, user, prediction, JSON-encoded features.
+
+With format='columnar' rows go to segments in a log directory instead. Each worker appends its
+batches to one open segment, raw row-major files plus a JSON header whose row count is the commit
+point (a partial append left by a crash is ignored). Once the open segment holds `segment_rows`
+rows or is `segment_seconds` old, or the logger closes, it is sealed into a normal segment, so
+light traffic still gives few, reasonably sized segments. Open segments left by a dead worker are
+sealed by the next logger to start, or with `python prediction_log.py seal`. A sealed segment is:
+  <segment>.features.npy  features as typed columns (column-major float64 or float32, shape rows x features)
+  <segment>.ts.npy        float64 UNIX timestamps
+  <segment>.user.npy      int32 codes into the segment's `users` list
+  <segment>.label.npy     int16 codes into the segment's `labels` list
+  <segment>.json          index: row count, time range, feature names, users, labels
+The .json file is written last and marks the segment complete. Segment names start with the
+time the segment was opened and include the worker pid, so workers never share a file and sorting
+by name gives write order. ColumnarLogReader memory-maps the sealed segments so scans don't load
+the whole log; rows in open segments become visible when they are sealed.
+
+Usage:
+  python prediction_log.py convert prediction_logs.csv prediction_logs/
+  python prediction_log.py summary prediction_logs/
+  python prediction_log.py seal prediction_logs/     # seal open segments of workers that are gone
+"""
+import argparse
+import atexit
+import csv
+import datetime
+import glob
+import io
+import json
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl; the development server is a single process there
+    fcntl = None
+
+_STOP = object()
+
+
+def _iso_timestamp(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).replace(tzinfo=None).isoformat() + 'Z'
+
+
+class PredictionLogger:
+    def __init__(self, path='prediction_logs.csv', batch_size=500, flush_interval=1.0, max_queue=100000,
+                 format='csv', dtype='float64', segment_rows=10000, segment_seconds=300.0):
+        if format not in ('csv', 'columnar'):
+            raise ValueError(f"unknown prediction log format {format!r} (expected 'csv' or 'columnar')")
+        self.path = path
+        self.format = format
+        self.dtype = np.dtype(dtype)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.segment_rows = segment_rows
+        self.segment_seconds = segment_seconds
+        self._segment_seq = 0
+        self._open_segment = None
+        self.written = 0
+        self.dropped = 0
+        self.write_errors = 0
+        self.last_error = None
+        self._counter_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        atexit.register(self.close)
+
+    def log(self, user, preds, features_list):
+        """Queue one record per prediction; never blocks and never raises."""
+        self._ensure_started()
+        ts = time.time()
+        user = user or ''
+        for pred, features in zip(preds, features_list):
+            try:
+                self._queue.put_nowait((ts, user, str(pred), features))
+            except queue.Full:
+                self._count_dropped(1, 'queue full')
+
+    def flush(self, timeout=10.0):
+        """Block until everything queued before this call has been written (or `timeout` passes)."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return
+        done.wait(timeout)
+
+    def close(self, timeout=10.0):
+        """Write out pending records and stop the background thread (registered with atexit)."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'written': self.written,
+            'dropped': self.dropped,
+            'write_errors': self.write_errors,
+            'last_error': self.last_error,
+        }
+
+    def _ensure_started(self):
+        # the thread is started lazily, and again after a fork (gunicorn workers don't inherit threads)
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._pid = os.getpid()
+            # an open segment inherited across a fork belongs to the parent
+            self._open_segment = None
+            self._thread = threading.Thread(target=self._run, name='prediction-log', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        if self.format == 'columnar':
+            try:
+                seal_orphaned_segments(self.path)
+            except Exception as e:
+                self._record_write_error(f'sealing orphaned segments failed: {e}')
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+            if item is _STOP or isinstance(item, threading.Event):
+                self._write(batch)
+                batch = []
+                if item is _STOP:
+                    self._seal_open_segment()
+                    return
+                item.set()
+                continue
+            if item is not None:
+                batch.append(item)
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._write(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _write(self, batch):
+        if self.format == 'columnar':
+            # called on every flush tick, also with an empty batch, so an idle open segment still ages out
+            self._write_columnar(batch)
+        elif batch:
+            self._write_csv(batch)
+
+    def _write_csv(self, batch):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        rows = 0
+        for ts, user, pred, features in batch:
+            try:
+                features_json = json.dumps(features, ensure_ascii=False)
+            except (TypeError, ValueError) as e:
+                self._count_dropped(1, f'unencodable features: {e}')
+                continue
+            writer.writerow([_iso_timestamp(ts), user, pred, features_json])
+            rows += 1
+        if not rows:
+            return
+        try:
+            with open(self.path, 'a', encoding='utf-8', newline='') as f:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    f.write(buf.getvalue())
+                    f.flush()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        except Exception as e:
+            with self._counter_lock:
+                self.write_errors += 1
+            self._count_dropped(rows, f'write failed: {e}')
+            return
+        with self._counter_lock:
+            self.written += rows
+
+    def _write_columnar(self, batch):
+        # records with a different feature set (not expected from app.py) roll over to a new segment
+        groups = {}
+        for record in batch:
+            features = record[3]
+            if not isinstance(features, dict):
+                self._count_dropped(1, 'features are not a dict')
+                continue
+            groups.setdefault(frozenset(features), []).append(record)
+        for key, records in groups.items():
+            segment = self._open_segment
+            if segment is not None and frozenset(segment.feature_names) != key:
+                self._seal_open_segment()
+                segment = self._open_segment
+            feature_names = segment.feature_names if segment is not None else list(records[0][3])
+            X = np.empty((len(records), len(feature_names)), dtype=self.dtype)
+            keep = np.ones(len(records), dtype=bool)
+            for r, (_, _, _, features) in enumerate(records):
+                try:
+                    X[r] = [features[name] for name in feature_names]
+                except (TypeError, ValueError) as e:
+                    keep[r] = False
+                    self._count_dropped(1, f'non-numeric features: {e}')
+            if not keep.all():
+                X = X[keep]
+                records = [rec for rec, k in zip(records, keep) if k]
+            if not records:
+                continue
+            try:
+                if segment is None:
+                    segment = self._open_segment = OpenSegment.create(
+                        self.path, self._next_segment_name('open'), feature_names, self.dtype)
+                segment.append(X, [rec[0] for rec in records], [rec[1] for rec in records], [rec[2] for rec in records])
+            except Exception as e:
+                self._record_write_error(f'write failed: {e}', len(records))
+                continue
+            with self._counter_lock:
+                self.written += len(records)
+        segment = self._open_segment
+        if segment is not None and (segment.rows >= self.segment_rows
+                                    or time.time() - segment.created >= self.segment_seconds):
+            self._seal_open_segment()
+
+    def _seal_open_segment(self):
+        segment = self._open_segment
+        if segment is None:
+            return
+        try:
+            segment.seal()
+        except Exception as e:
+            # keep it open; the next size/age check tries again
+            self._record_write_error(f'sealing {segment.name} failed: {e}')
+            return
+        self._open_segment = None
+
+    def _next_segment_name(self, prefix='seg'):
+        self._segment_seq += 1
+        return f'{prefix}-{time.time_ns():020d}-{os.getpid()}-{self._segment_seq:06d}'
+
+    def _record_write_error(self, reason, dropped=0):
+        with self._counter_lock:
+            self.write_errors += 1
+            self.dropped += dropped
+            self.last_error = reason
+
+    def _count_dropped(self, n, reason):
+        with self._counter_lock:
+            self.dropped += n
+            self.last_error = reason
+
+
+def write_segment(directory, name, features, feature_names, timestamps, users, labels):
+    """Write one columnar segment; the .json index is renamed into place last so readers never see a partial segment."""
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, name)
+    user_list, user_codes = np.unique(np.asarray(users, dtype=object).astype(str), return_inverse=True)
+    label_list, label_codes = np.unique(np.asarray(labels, dtype=object).astype(str), return_inverse=True)
+    ts = np.asarray(timestamps, dtype=np.float64)
+    np.save(base + '.features.npy', np.asfortranarray(features))
+    np.save(base + '.ts.npy', ts)
+    np.save(base + '.user.npy', user_codes.astype(np.int32))
+    np.save(base + '.label.npy', label_codes.astype(np.int16))
+    index = {
+        'rows': int(len(ts)),
+        'ts_min': float(ts.min()),
+        'ts_max': float(ts.max()),
+        'feature_names': list(feature_names),
+        'dtype': str(np.asarray(features).dtype),
+        'users': user_list.tolist(),
+        'labels': label_list.tolist(),
+    }
+    with open(base + '.json.tmp', 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+    os.replace(base + '.json.tmp', base + '.json')
+
+
+class OpenSegment:
+    """A segment a worker is still appending to.
+
+    Columns are raw row-major files (<name>.features.bin, .ts.bin, .user.bin, .label.bin) and <name>.json holds the
+    committed row count plus feature names, dtype and the user/label code lists. The header is rewritten (temp file +
+    rename) after each append, so bytes beyond the committed rows are leftovers of a failed append; the next append
+    truncates them. seal() turns it into a normal segment named 'seg-...' after the same time/pid/sequence.
+    """
+
+    COLUMNS = (('features', None), ('ts', np.float64), ('user', np.int32), ('label', np.int16))
+
+    def __init__(self, directory, name, header):
+        self.directory = directory
+        self.name = name
+        self.feature_names = header['feature_names']
+        self.dtype = np.dtype(header['dtype'])
+        self.created = header['created']
+        self.rows = header['rows']
+        self.users = header['users']
+        self.labels = header['labels']
+        self._user_codes = {u: i for i, u in enumerate(self.users)}
+        self._label_codes = {lab: i for i, lab in enumerate(self.labels)}
+
+    @classmethod
+    def create(cls, directory, name, feature_names, dtype):
+        os.makedirs(directory, exist_ok=True)
+        segment = cls(directory, name, {'feature_names': list(feature_names), 'dtype': np.dtype(dtype).str,
+                                        'created': time.time(), 'rows': 0, 'users': [], 'labels': []})
+        segment._write_header()
+        return segment
+
+    @classmethod
+    def load(cls, directory, name):
+        with open(os.path.join(directory, name + '.json'), 'r', encoding='utf-8') as f:
+            return cls(directory, name, json.load(f))
+
+    @property
+    def sealed_name(self):
+        return 'seg' + self.name[len('open'):]
+
+    def _path(self, column):
+        return os.path.join(self.directory, f'{self.name}.{column}.bin')
+
+    def _row_bytes(self, column):
+        if column == 'features':
+            return self.dtype.itemsize * len(self.feature_names)
+        return np.dtype(dict(self.COLUMNS)[column]).itemsize
+
+    def _code(self, codes, values, value):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+    def append(self, features, timestamps, users, labels):
+        columns = {
+            'features': np.ascontiguousarray(features, dtype=self.dtype),
+            'ts': np.asarray(timestamps, dtype=np.float64),
+            'user': np.array([self._code(self._user_codes, self.users, str(u)) for u in users], dtype=np.int32),
+            'label': np.array([self._code(self._label_codes, self.labels, str(lab)) for lab in labels], dtype=np.int16),
+        }
+        for column, values in columns.items():
+            with open(self._path(column), 'ab') as f:
+                f.truncate(self.rows * self._row_bytes(column))
+                f.write(values.tobytes())
+        self.rows += len(columns['ts'])
+        self._write_header()
+
+    def read(self):
+        """(features, timestamps, users, labels) of the committed rows."""
+        n = self.rows
+        features = np.fromfile(self._path('features'), dtype=self.dtype, count=n * len(self.feature_names))
+        ts = np.fromfile(self._path('ts'), dtype=np.float64, count=n)
+        user_codes = np.fromfile(self._path('user'), dtype=np.int32, count=n)
+        label_codes = np.fromfile(self._path('label'), dtype=np.int16, count=n)
+        return (features.reshape(n, len(self.feature_names)), ts,
+                np.asarray(self.users, dtype=object)[user_codes], np.asarray(self.labels, dtype=object)[label_codes])
+
+    def seal(self):
+        """Write the committed rows as a normal segment and remove the open files."""
+        if self.rows and not os.path.exists(os.path.join(self.directory, self.sealed_name + '.json')):
+            features, ts, users, labels = self.read()
+            write_segment(self.directory, self.sealed_name, features, self.feature_names, ts, users, labels)
+        # the header goes last: a crash part-way leaves a header whose sealed segment already exists
+        for column, _ in self.COLUMNS:
+            try:
+                os.remove(self._path(column))
+            except FileNotFoundError:
+                pass
+        os.remove(os.path.join(self.directory, self.name + '.json'))
+
+    def _write_header(self):
+        header = {'feature_names': self.feature_names, 'dtype': self.dtype.str, 'created': self.created,
+                  'rows': self.rows, 'users': self.users, 'labels': self.labels}
+        path = os.path.join(self.directory, self.name + '.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(header, f)
+        os.replace(path + '.tmp', path)
+
+
+def _pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    if os.name != 'posix':
+        # no signal-0 probe; the development server is a single process there
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def open_segment_names(directory):
+    paths = glob.glob(os.path.join(directory, 'open-*.json'))
+    return sorted(os.path.basename(p)[:-len('.json')] for p in paths)
+
+
+def seal_orphaned_segments(directory):
+    """Seal open segments whose worker process is gone; returns how many were sealed."""
+    sealed = 0
+    for name in open_segment_names(directory):
+        if _pid_alive(int(name.split('-')[2])):
+            continue
+        try:
+            OpenSegment.load(directory, name).seal()
+        except FileNotFoundError:
+            # sealed by another worker meanwhile
+            continue
+        sealed += 1
+    return sealed
+
+
+class ColumnarLogReader:
+    """Read a columnar prediction-log directory one memory-mapped segment at a time.
+
+    Each segment is a dict with the .json index fields plus 'name', 'features' (rows x features,
+    memory-mapped), 'ts', 'user_codes' and 'label_codes'. Decode codes with the segment's
+    'users' / 'labels' lists, e.g. np.asarray(seg['labels'])[seg['label_codes']].
+    """
+
+    def __init__(self, directory='prediction_logs'):
+        self.directory = directory
+
+    def segment_names(self):
+        paths = glob.glob(os.path.join(self.directory, 'seg-*.json'))
+        return sorted(os.path.basename(p)[:-len('.json')] for p in paths)
+
+    def __len__(self):
+        return sum(self.read_index(name)['rows'] for name in self.segment_names())
+
+    def read_index(self, name):
+        with open(os.path.join(self.directory, name + '.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def read_segment(self, name):
+        base = os.path.join(self.directory, name)
+        segment = self.read_index(name)
+        segment['name'] = name
+        segment['features'] = np.load(base + '.features.npy', mmap_mode='r')
+        segment['ts'] = np.load(base + '.ts.npy', mmap_mode='r')
+        segment['user_codes'] = np.load(base + '.user.npy', mmap_mode='r')
+        segment['label_codes'] = np.load(base + '.label.npy', mmap_mode='r')
+        return segment
+
+    def iter_segments(self, after=None):
+        """Yield segments in write order, optionally only those named after `after` (for resumable scans)."""
+        for name in self.segment_names():
+            if after is None or name > after:
+                yield self.read_segment(name)
+
+    def iter_records(self):
+        """Yield (timestamp, user, prediction, features dict) rows, the same fields as the CSV log."""
+        for seg in self.iter_segments():
+            names = seg['feature_names']
+            users = seg['users']
+            labels = seg['labels']
+            for i in range(seg['rows']):
+                row = seg['features'][i]
+                yield (_iso_timestamp(float(seg['ts'][i])), users[seg['user_codes'][i]], labels[seg['label_codes'][i]],
+                       {n: float(v) for n, v in zip(names, row)})
+
+
+def convert_csv_log(csv_path, directory, segment_rows=100000, dtype='float64'):
+    """Convert a CSV prediction log into columnar segments of up to `segment_rows` rows; returns rows converted."""
+    total = 0
+    seq = 0
+
+    def flush(rows):
+        nonlocal seq
+        seq += 1
+        feature_names = list(rows[0][3])
+        X = np.array([[r[3][n] for n in feature_names] for r in rows], dtype=dtype)
+        write_segment(directory, f'seg-{time.time_ns():020d}-{os.getpid()}-{seq:06d}', X, feature_names,
+                      [r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows])
+
+    rows = []
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        for ts, user, pred, features_json in csv.reader(f):
+            features = json.loads(features_json)
+            # key order may differ between clients; flush() reorders to the first row's feature names
+            if rows and features.keys() != rows[0][3].keys():
+                flush(rows)
+                rows = []
+            parsed = datetime.datetime.fromisoformat(ts.rstrip('Z')).replace(tzinfo=datetime.timezone.utc)
+            rows.append((parsed.timestamp(), user, pred, features))
+            total += 1
+            if len(rows) >= segment_rows:
+                flush(rows)
+                rows = []
+    if rows:
+        flush(rows)
+    return total
+
+
+def summarize(directory):
+    reader = ColumnarLogReader(directory)
+    rows = 0
+    label_counts = {}
+    for seg in reader.iter_segments():
+        rows += seg['rows']
+        counts = np.bincount(seg['label_codes'], minlength=len(seg['labels']))
+        for label, n in zip(seg['labels'], counts):
+            label_counts[label] = label_counts.get(label, 0) + int(n)
+    unsealed = sum(OpenSegment.load(directory, name).rows for name in open_segment_names(directory))
+    return {'segments': len(reader.segment_names()), 'rows': rows, 'unsealed_rows': unsealed, 'predictions': label_counts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert or summarize prediction logs.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    conv = sub.add_parser('convert', help='convert a CSV prediction log into columnar segments')
+    conv.add_argument('csv_path')
+    conv.add_argument('directory')
+    conv.add_argument('--segment-rows', type=int, default=100000)
+    conv.add_argument('--dtype', choices=['float64', 'float32'], default='float64')
+    summ = sub.add_parser('summary', help='print row and prediction counts for a columnar log directory')
+    summ.add_argument('directory')
+    seal = sub.add_parser('seal', help='seal open segments left by workers that are no longer running')
+    seal.add_argument('directory')
+    args = parser.parse_args()
+    if args.command == 'convert':
+        n = convert_csv_log(args.csv_path, args.directory, args.segment_rows, args.dtype)
+        print(f'Converted {n} rows into {args.directory}')
+    elif args.command == 'seal':
+        print(f'Sealed {seal_orphaned_segments(args.directory)} open segments in {args.directory}')
+    else:
+        print(json.dumps(summarize(args.directory), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,8 +4,18 @@ sort.py
 Contains AI-suggested and optimized implementations for sorting a list of dictionaries by a key.
 Includes examples and a short analysis.
 """
+import heapq
+import multiprocessing
+import os
+import random
+import timeit
 from operator import itemgetter
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional here; sort_dicts_by_key_numpy falls back to list.sort
+    np = None
 
 # AI-suggested implementation (concise)
 def sort_dicts_by_key_ai(lst: Iterable[Dict[str, Any]], key: str, reverse: bool = False) -> List[Dict[str, Any]]:
@@ -39,6 +49,265 @@ def sort_dicts_by_key_dsu(lst: Iterable[Dict[str, Any]], key: str, reverse: bool
     return [d for _, d in decorated]
 
 
+# Top-k selection: the first k items of the sorted order without sorting the whole input
+def top_k_dicts_by_key(lst: Iterable[Dict[str, Any]], key: str, k: int, reverse: bool = False, missing_value: Optional[Any] = None) -> List[Dict[str, Any]]:
+    """Return the first `k` dicts of the order sort_dicts_by_key_inplace_safe would produce.
+    Uses a bounded heap (heapq.nsmallest/nlargest): O(n log k) time, O(k) memory, and the input is consumed lazily,
+    so generators and files work without materializing them. Ties keep their input order, as in a stable full sort.
+    """
+    if k <= 0:
+        return []
+    get_key = lambda d, name=key, mv=missing_value: d.get(name, mv)
+    if reverse:
+        return heapq.nlargest(k, lst, key=get_key)
+    return heapq.nsmallest(k, lst, key=get_key)
+
+
+# Columnar engine: extract the key column once and argsort it in NumPy
+_MAX_EXACT_FLOAT_INT = 2 ** 53
+_MAX_CATEGORIES = 4096
+
+
+def _column_sort_array(col: List[Any]):
+    # a NumPy array whose stable ascending order equals Python's order for `col`, or None when
+    # the column can't be represented exactly (mixed/incomparable types, NaN, huge ints)
+    types = set(map(type, col))
+    if types <= {int, bool}:
+        try:
+            arr = np.array(col, dtype=np.int64)
+        except OverflowError:
+            return None
+        return _narrow(arr)
+    if types <= {int, bool, float}:
+        if int in types and not all(-_MAX_EXACT_FLOAT_INT <= v <= _MAX_EXACT_FLOAT_INT for v in col if type(v) is int):
+            return None
+        arr = np.array(col, dtype=np.float64)
+        # Python's sort has no total order with NaN; keep its behaviour by falling back
+        return None if np.isnan(arr).any() else arr
+    if len(types) == 1:
+        # strings and other hashable categories: integer codes from the sorted distinct values
+        # near-unique keys: ranking them is itself a full sort, so list.sort is as fast; a small
+        # prefix sample rejects those before paying for the full set
+        try:
+            sample = col[:2 * _MAX_CATEGORIES]
+            if len(sample) > _MAX_CATEGORIES and len(set(sample)) > len(sample) // 2:
+                return None
+            distinct = set(col)
+        except TypeError:
+            return None
+        if len(distinct) > max(_MAX_CATEGORIES, len(col) // 8):
+            return None
+        try:
+            rank = {v: i for i, v in enumerate(sorted(distinct))}
+        except TypeError:
+            return None
+        return _narrow(np.fromiter(map(rank.__getitem__, col), dtype=np.int64, count=len(col)))
+    return None
+
+
+def _narrow(arr):
+    # small-range integer columns (ages, category codes) become uint16, which NumPy's stable sort radix-sorts
+    if not len(arr):
+        return arr
+    lo, hi = int(arr.min()), int(arr.max())
+    if hi - lo < 2 ** 16:
+        return (arr - lo).astype(np.uint16)
+    return arr
+
+
+def argsort_dicts_by_key(lst: List[Dict[str, Any]], key: str, reverse: bool = False, missing_value: Optional[Any] = None):
+    """Return the stable permutation (NumPy int array) that sorts `lst` like sort_dicts_by_key_inplace_safe,
+    or None when the key column can't be typed exactly or has near-unique non-numeric values.
+    Useful on its own when only a page of the order is needed: lst[i] for i in perm[offset:offset + limit].
+    """
+    if np is None:
+        return None
+    arr = _column_sort_array([d.get(key, missing_value) for d in lst])
+    if arr is None:
+        return None
+    if not reverse:
+        return np.argsort(arr, kind='stable')
+    # descending with ties in input order (like list.sort(reverse=True)): stable-sort the reversed
+    # column, then reverse the result and map positions back; avoids negating (int64 overflow)
+    n = len(arr)
+    return (n - 1) - np.argsort(arr[::-1], kind='stable')[::-1]
+
+
+def sort_dicts_by_key_numpy(lst: List[Dict[str, Any]], key: str, reverse: bool = False, missing_value: Optional[Any] = None) -> List[Dict[str, Any]]:
+    """In-place sort with the same result as sort_dicts_by_key_inplace_safe (stable, missing keys as `missing_value`).
+    The key column is pulled into a typed NumPy array once (categories become integer codes, small integer
+    ranges are radix-sorted) and ordered with a stable argsort, so comparisons run in C instead of on Python
+    objects. Columns that can't be typed exactly (mixed types, NaN, ints beyond int64/float precision),
+    near-unique string columns and runs without NumPy fall back to list.sort.
+    """
+    if len(lst) < 2:
+        return lst
+    perm = argsort_dicts_by_key(lst, key, reverse, missing_value)
+    if perm is None:
+        return sort_dicts_by_key_inplace_safe(lst, key, reverse, missing_value)
+    lst[:] = itemgetter(*perm.tolist())(lst)
+    return lst
+
+
+# Parallel sort: key extraction and partition sorts in forked workers, keys shared through shared memory
+# Smallest list the parallel path is used for by default. None = opt-in only: no crossover against the single-core
+# sort has been measured yet. Set it (or pass min_size) from benchmark_parallel()'s 'crossover' on the target host.
+PARALLEL_MIN_SIZE: Optional[int] = None
+
+# the list being sorted; set before the pool forks so workers inherit it instead of receiving pickled dicts
+_PARALLEL_SOURCE: List[Dict[str, Any]] = []
+
+
+def _parallel_sort_partition(args) -> bool:
+    # worker: write this partition's float64 keys into the shared key array and its stable order
+    # (as global positions) into the shared permutation; False if the keys aren't exactly numeric
+    from multiprocessing import shared_memory
+    start, stop, key, missing_value, reverse, keys_name, perm_name = args
+    col = [d.get(key, missing_value) for d in _PARALLEL_SOURCE[start:stop]]
+    types = set(map(type, col))
+    if not types <= {int, bool, float}:
+        return False
+    if int in types and not all(-_MAX_EXACT_FLOAT_INT <= v <= _MAX_EXACT_FLOAT_INT for v in col if type(v) is int):
+        return False
+    part = np.array(col, dtype=np.float64)
+    if np.isnan(part).any():
+        return False
+    if reverse:
+        # negation is exact for float64, so descending with ties in input order is a stable ascending sort
+        np.negative(part, out=part)
+    keys_shm = shared_memory.SharedMemory(name=keys_name)
+    perm_shm = shared_memory.SharedMemory(name=perm_name)
+    try:
+        n = len(_PARALLEL_SOURCE)
+        np.ndarray((n,), dtype=np.float64, buffer=keys_shm.buf)[start:stop] = part
+        np.ndarray((n,), dtype=np.int64, buffer=perm_shm.buf)[start:stop] = np.argsort(part, kind='stable') + start
+    finally:
+        keys_shm.close()
+        perm_shm.close()
+    return True
+
+
+def sort_dicts_by_key_parallel(lst: List[Dict[str, Any]], key: str, reverse: bool = False, missing_value: Optional[Any] = None,
+                               processes: Optional[int] = None, min_size: Optional[int] = None) -> List[Dict[str, Any]]:
+    """In-place sort with the same result as sort_dicts_by_key_inplace_safe, spread over `processes` cores.
+    Forked workers (which inherit `lst`, so no dicts are pickled) each extract one partition's keys into a
+    shared float64 array and stably argsort it; the parent merges the sorted partitions with one stable
+    argsort over the concatenated runs (timsort merges presorted runs in O(n log p)) and applies the permutation.
+    Only numeric keys are handled; other keys, lists shorter than `min_size` (default PARALLEL_MIN_SIZE; when
+    both are None the parallel path is off), a single core, platforms without fork, or runs without NumPy use
+    sort_dicts_by_key_inplace_safe.
+    """
+    global _PARALLEL_SOURCE
+    processes = processes or os.cpu_count() or 1
+    if min_size is None:
+        min_size = PARALLEL_MIN_SIZE
+    if (np is None or min_size is None or len(lst) < max(min_size, 2) or processes < 2
+            or 'fork' not in multiprocessing.get_all_start_methods()):
+        return sort_dicts_by_key_inplace_safe(lst, key, reverse, missing_value)
+    from multiprocessing import shared_memory
+    n = len(lst)
+    bounds = [n * i // processes for i in range(processes + 1)]
+    keys_shm = shared_memory.SharedMemory(create=True, size=n * 8)
+    perm_shm = shared_memory.SharedMemory(create=True, size=n * 8)
+    try:
+        _PARALLEL_SOURCE = lst
+        tasks = [(bounds[i], bounds[i + 1], key, missing_value, reverse, keys_shm.name, perm_shm.name)
+                 for i in range(processes)]
+        with multiprocessing.get_context('fork').Pool(processes) as pool:
+            ok = all(pool.map(_parallel_sort_partition, tasks))
+        if not ok:
+            return sort_dicts_by_key_inplace_safe(lst, key, reverse, missing_value)
+        keys = np.ndarray((n,), dtype=np.float64, buffer=keys_shm.buf)
+        runs = np.ndarray((n,), dtype=np.int64, buffer=perm_shm.buf)
+        # partitions are in input order and each is stable, so a stable merge keeps ties in input order
+        perm = runs[np.argsort(keys[runs], kind='stable')]
+        del keys, runs
+        lst[:] = itemgetter(*perm.tolist())(lst)
+        return lst
+    finally:
+        _PARALLEL_SOURCE = []
+        keys_shm.close()
+        keys_shm.unlink()
+        perm_shm.close()
+        perm_shm.unlink()
+
+
+def benchmark_parallel(sizes: Sequence[int] = (100000, 250000, 500000, 1000000, 2000000), repeat: int = 3,
+                       processes: Optional[int] = None) -> Dict[str, Any]:
+    """Best-of-`repeat` seconds sorting n dicts by a float key with sort_dicts_by_key_parallel (forced on) vs
+    sort_dicts_by_key_inplace_safe, for each n in `sizes`. 'crossover' is the smallest size from which the parallel
+    path is faster at every larger measured size (None if it never is): the value to use for PARALLEL_MIN_SIZE.
+    """
+    rng = random.Random(0)
+    rows = []
+    for n in sorted(sizes):
+        data = [{"id": i, "score": rng.random()} for i in range(n)]
+        rows.append({
+            "n": n,
+            "parallel": min(timeit.repeat(lambda: sort_dicts_by_key_parallel(list(data), "score", processes=processes,
+                                                                             min_size=0),
+                                          number=1, repeat=repeat)),
+            "single": min(timeit.repeat(lambda: sort_dicts_by_key_inplace_safe(list(data), "score"),
+                                        number=1, repeat=repeat)),
+        })
+    crossover = None
+    for row in reversed(rows):
+        if row["parallel"] >= row["single"]:
+            break
+        crossover = row["n"]
+    return {"processes": processes or os.cpu_count() or 1, "sizes": rows, "crossover": crossover}
+
+
+# Composite sort: several keys with mixed directions, each key extracted once
+SortSpec = Union[Tuple[str, str], Tuple[str, str, Any]]
+
+def sort_dicts_by_keys(lst: Iterable[Dict[str, Any]], specs: Sequence[SortSpec]) -> List[Dict[str, Any]]:
+    """Return a new list sorted by several keys, e.g. [("nationality", "asc"), ("age", "desc", 0)].
+    Each spec is (key, "asc"|"desc") or (key, direction, missing_value). Missing keys take `missing_value`;
+    missing keys without one (or None values) sort last for that key in either direction.
+    Each key is extracted once per dict into a column; a list of row indices is then stably sorted by each
+    column from the least to the most significant key, using the column's C-level __getitem__ as the key
+    (no lambdas, no per-comparison Python calls, descending handled by the sort itself).
+    """
+    lst = list(lst)
+    order = list(range(len(lst)))
+    for spec in reversed(specs):
+        key, direction = spec[0], spec[1]
+        missing_value = spec[2] if len(spec) > 2 else None
+        if direction not in ("asc", "desc"):
+            raise ValueError(f"sort direction must be 'asc' or 'desc', got {direction!r}")
+        desc = direction == "desc"
+        col = [d.get(key, missing_value) for d in lst]
+        if None in col:
+            # flag missing values so they land last in both directions
+            present, missing = (1, 0) if desc else (0, 1)
+            col = [(missing,) if v is None else (present, v) for v in col]
+        order.sort(key=col.__getitem__, reverse=desc)
+    return [lst[i] for i in order]
+
+
+def benchmark_composite(n: int = 100000, repeat: int = 5) -> Dict[str, float]:
+    """Best-of-`repeat` seconds for "nationality asc, age desc, score asc" via sort_dicts_by_keys
+    vs chaining sort_dicts_by_key_inplace_safe once per key.
+    """
+    rng = random.Random(0)
+    nationalities = ["USA", "UK", "Canada", "Nigeria", "Kenya", "India", "China"]
+    data = [{"nationality": rng.choice(nationalities), "age": rng.randint(10, 80), "score": rng.random()} for _ in range(n)]
+    specs = [("nationality", "asc"), ("age", "desc"), ("score", "asc")]
+
+    def chained():
+        # stable sorts applied from the least to the most significant key
+        out = sort_dicts_by_key_inplace_safe(list(data), "score")
+        out = sort_dicts_by_key_inplace_safe(out, "age", reverse=True)
+        return sort_dicts_by_key_inplace_safe(out, "nationality")
+
+    assert sort_dicts_by_keys(data, specs) == chained()
+    return {
+        "composite": min(timeit.repeat(lambda: sort_dicts_by_keys(data, specs), number=1, repeat=repeat)),
+        "chained": min(timeit.repeat(chained, number=1, repeat=repeat)),
+    }
+
+
 # Example usage
 if __name__ == "__main__":
     data = [
@@ -67,6 +336,13 @@ if __name__ == "__main__":
     # DSU
     print("dsu:", sort_dicts_by_key_dsu(data, "score"))
 
+    # Top-k (missing score treated as -1 so it sorts last in descending order)
+    print("top 2 (desc):", top_k_dicts_by_key(iter(data), "score", 2, reverse=True, missing_value=-1))
+
+    # Composite: score descending, missing score last, then name ascending
+    print("composite:", sort_dicts_by_keys(data, [("score", "desc"), ("name", "asc")]))
+    print("composite vs chained (100k dicts, seconds):", benchmark_composite())
+
 
 # Analysis (~200 words)
 ANALYSIS = (
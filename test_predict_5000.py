@@ -1,22 +1,28 @@
-"""Test the /predict endpoint with sample data"""
+"""Test the /predict/batch endpoint with 5000 records in a single request"""
 import requests
 import json
+import time
 from sklearn.datasets import load_breast_cancer
 
 # Get feature names from the dataset
 data = load_breast_cancer(as_frame=True)
-X = data.frame.iloc[0]  # use first row as example
+X = data.frame.drop(columns=['target'])
 
-# Create sample features
-features = {col: float(val) for col, val in X.items()}
+# Build 5000 feature dicts by resampling the dataset rows
+sample = X.sample(5000, replace=True, random_state=0)
+records = [{col: float(val) for col, val in row.items()} for _, row in sample.iterrows()]
 
-# Make prediction request (use port 5000 - Flask default)
-url = 'http://127.0.0.1:5000/predict'
-print('Sending features:', json.dumps(features, indent=2))
-response = requests.post(url, json=features)
+# Make one batch prediction request (use port 5000 - Flask default)
+url = 'http://127.0.0.1:5000/predict/batch'
+print('Sending', len(records), 'records; first:', json.dumps(records[0], indent=2))
+start = time.perf_counter()
+response = requests.post(url, json=records)
+elapsed = time.perf_counter() - start
 
-print('\nResponse:', response.status_code)
+print('\nResponse:', response.status_code, f'({elapsed:.3f}s)')
 if response.ok:
-    print('Prediction:', response.json())
+    preds = response.json()['predictions']
+    print('Predictions:', len(preds), 'first 10:', preds[:10])
+    print(f'Throughput: {len(preds) / elapsed:.0f} records/s')
 else:
-    print('Error:', response.text)
\ No newline at end of file
+    print('Error:', response.text)
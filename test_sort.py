@@ -0,0 +1,108 @@
+"""Regression tests: every sort variant gives exactly the order of sort_dicts_by_key_inplace_safe.
+
+Seeded data with many ties (so stability shows), both directions, with and without missing keys.
+Run with `python test_sort.py` or `python -m pytest test_sort.py`.
+"""
+import random
+
+import sort
+from external_sort import external_sort
+
+# key -> (value generator, missing_value comparable with those values)
+KEYS = {
+    'small_int': (lambda rng: rng.randint(0, 9), -1),
+    'float': (lambda rng: rng.choice([0.5, 1.25, -3.0, 2.0, rng.random()]), float('-inf')),
+    'category': (lambda rng: rng.choice(['de', 'fr', 'jp', 'us']), ''),
+}
+SIZES = (0, 1, 7, 500, 3000)
+MISSING_RATIOS = (0.0, 0.2)
+
+
+def make_data(n, missing_ratio, seed=0):
+    rng = random.Random(seed)
+    data = []
+    for i in range(n):
+        d = {'id': i}
+        for key, (gen, _) in KEYS.items():
+            if rng.random() >= missing_ratio:
+                d[key] = gen(rng)
+        data.append(d)
+    return data
+
+
+def cases():
+    """(data, key, reverse, missing_value, expected ids) for every size/key/direction/missing combination."""
+    for n in SIZES:
+        for ratio in MISSING_RATIOS:
+            data = make_data(n, ratio, seed=n)
+            for key, (_, missing_value) in KEYS.items():
+                for reverse in (False, True):
+                    expected = sort.sort_dicts_by_key_inplace_safe(list(data), key, reverse, missing_value)
+                    yield data, key, reverse, missing_value, ids(expected)
+
+
+def ids(lst):
+    return [d['id'] for d in lst]
+
+
+def check(name, variant):
+    for data, key, reverse, missing_value, expected in cases():
+        got = ids(variant(list(data), key, reverse, missing_value))
+        assert got == expected, f'{name}: wrong order for key={key} reverse={reverse} n={len(data)}'
+
+
+def test_dsu():
+    check('dsu', sort.sort_dicts_by_key_dsu)
+
+
+def test_numpy():
+    check('numpy', sort.sort_dicts_by_key_numpy)
+
+
+def test_argsort():
+    def via_argsort(lst, key, reverse, missing_value):
+        perm = sort.argsort_dicts_by_key(lst, key, reverse, missing_value)
+        return lst if perm is None else [lst[i] for i in perm]
+    check('argsort', via_argsort)
+
+
+def test_parallel():
+    # forced on (min_size=0) and over two processes, whatever the host's core count
+    check('parallel', lambda lst, key, reverse, mv: sort.sort_dicts_by_key_parallel(lst, key, reverse, mv,
+                                                                                     processes=2, min_size=0))
+
+
+def test_external_sort():
+    # tiny runs and a 2-way merge force several merge passes
+    check('external', lambda lst, key, reverse, mv: list(external_sort(iter(lst), key, reverse, mv,
+                                                                      chunk_size=37, max_open_runs=2)))
+
+
+def test_top_k():
+    for data, key, reverse, missing_value, expected in cases():
+        for k in (0, 1, 5, len(data), len(data) + 3):
+            got = ids(sort.top_k_dicts_by_key(iter(data), key, k, reverse, missing_value))
+            assert got == expected[:k], f'top_k: wrong result for key={key} reverse={reverse} k={k}'
+
+
+def test_sort_dicts_by_keys():
+    # against chained stable safe sorts, least significant key first
+    specs_list = [
+        [('category', 'asc', ''), ('small_int', 'desc', -1)],
+        [('small_int', 'desc', -1), ('float', 'asc', float('-inf')), ('category', 'desc', '')],
+    ]
+    for n in SIZES:
+        for ratio in MISSING_RATIOS:
+            data = make_data(n, ratio, seed=n)
+            for specs in specs_list:
+                expected = list(data)
+                for key, direction, missing_value in reversed(specs):
+                    sort.sort_dicts_by_key_inplace_safe(expected, key, direction == 'desc', missing_value)
+                assert ids(sort.sort_dicts_by_keys(iter(data), specs)) == ids(expected), f'sort_dicts_by_keys: {specs}'
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f'{name}: ok')
@@ -3,16 +3,59 @@ train_priority_model.py
 
 Loads the sklearn breast cancer dataset, synthesizes a 3-class 'priority' label, preprocesses, trains a RandomForestClassifier,
 evaluates accuracy and F1-score, and saves the trained model to model.pkl.
+
+The forest is fitted on all cores (--n-jobs, default -1). The prepared dataset, the train/test split and the labels are
+cached in --cache-dir under a hash of the raw data and the preparation settings, so retraining skips that work until the
+data or the settings change. --search runs a small hyperparameter grid (trees, depth, max_features) through 5-fold
+cross-validation on the training split in parallel, prints fit time next to the cross-validated macro F1 of every
+candidate, and refits the best one on the whole training split. The test split is only used to score the final model.
+
+--compact builds smaller variants of the trained model (first-k trees, depth-capped refits, a single tree distilled
+from the forest), saves each with compressed joblib and records file size, load time, p50/p99 single-row latency and the
+accuracy/F1 change in a JSON report. Variants are compared on a validation split held out of the training split (the
+model is refitted without it for that), never on the test split. With --latency-budget-ms the most accurate variant
+whose p99 fits the budget is rebuilt from the full model and saved instead of the full forest.
+
+Usage:
+  python train_priority_model.py
+  python train_priority_model.py --search
+  python train_priority_model.py --compact --latency-budget-ms 5
+  python train_priority_model.py --export-flat flat_model
+  python train_priority_model.py --no-cache --n-jobs 4
 """
+import argparse
+import copy
+import hashlib
+import json
+import os
+import tempfile
+import time
+
 import joblib
 import numpy as np
 import pandas as pd
 from sklearn.datasets import load_breast_cancer
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score, f1_score, classification_report
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import GridSearchCV, StratifiedKFold, train_test_split
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+
+# settings baked into the cached split; any change here gives a new cache key
+PREPARE_SETTINGS = {'version': 1, 'percentiles': [33, 66], 'test_size': 0.2, 'random_state': 42}
+
+# model selection only ever looks at the training split: CV folds for --search, a held-out part for --compact
+CV_FOLDS = 5
+VALIDATION_SIZE = 0.2
+
+DEFAULT_PARAMS = {'n_estimators': 200, 'max_depth': None, 'max_features': 'sqrt'}
+
+SEARCH_GRID = {
+    'n_estimators': [100, 200, 400],
+    'max_depth': [None, 8, 16],
+    'max_features': ['sqrt', 0.5],
+}
 
 
 def create_priority_labels(df: pd.DataFrame) -> pd.Series:
@@ -30,9 +73,27 @@ def create_priority_labels(df: pd.DataFrame) -> pd.Series:
     return scores.apply(map_priority)
 
 
-def main():
-    data = load_breast_cancer(as_frame=True)
-    X = data.frame.drop(columns=['target'])
+def dataset_hash(X: pd.DataFrame) -> str:
+    """Content hash of the raw features (column names, dtypes and values) plus PREPARE_SETTINGS."""
+    h = hashlib.sha256()
+    h.update(json.dumps(PREPARE_SETTINGS, sort_keys=True).encode('utf-8'))
+    h.update(json.dumps([[str(c), str(t)] for c, t in X.dtypes.items()]).encode('utf-8'))
+    h.update(np.ascontiguousarray(X.to_numpy()).tobytes())
+    return h.hexdigest()[:16]
+
+
+def prepare_data(cache_dir=None):
+    """Return (prepared dict, cache hit) with the split, label map and feature names; cached on disk when cache_dir is set."""
+    X = load_breast_cancer(as_frame=True).frame.drop(columns=['target'])
+    path = None
+    if cache_dir:
+        path = os.path.join(cache_dir, f'prepared-{dataset_hash(X)}.joblib')
+        if os.path.exists(path):
+            try:
+                return joblib.load(path), True
+            except Exception as e:
+                print(f'Ignoring unreadable cache {path}: {e}')
+
     # synthesize priority labels
     y = create_priority_labels(X)
 
@@ -41,28 +102,276 @@ def main():
     y_enc = y.map(label_map)
 
     # train/test split
-    X_train, X_test, y_train, y_test = train_test_split(X, y_enc, test_size=0.2, random_state=42, stratify=y_enc)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y_enc, test_size=PREPARE_SETTINGS['test_size'], random_state=PREPARE_SETTINGS['random_state'], stratify=y_enc)
+    prepared = {'X_train': X_train, 'X_test': X_test, 'y_train': y_train, 'y_test': y_test,
+                'label_map': label_map, 'feature_names': list(X.columns)}
+    if path:
+        os.makedirs(cache_dir, exist_ok=True)
+        joblib.dump(prepared, path + '.tmp')
+        os.replace(path + '.tmp', path)
+    return prepared, False
 
+
+def build_pipeline(n_estimators=200, max_depth=None, max_features='sqrt', n_jobs=-1):
     # pipeline: scaler + random forest
-    pipe = Pipeline([
+    return Pipeline([
         ('scaler', StandardScaler()),
-        ('rf', RandomForestClassifier(n_estimators=200, random_state=42, class_weight='balanced'))
+        ('rf', RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, max_features=max_features,
+                                      random_state=42, class_weight='balanced', n_jobs=n_jobs))
     ])
 
-    pipe.fit(X_train, y_train)
-    y_pred = pipe.predict(X_test)
 
+def fit_and_score(params, prepared, n_jobs=-1):
+    """Fit one candidate; returns (pipeline, result dict with params, fit/predict seconds, accuracy and macro F1)."""
+    pipe = build_pipeline(n_jobs=n_jobs, **params)
+    start = time.perf_counter()
+    pipe.fit(prepared['X_train'], prepared['y_train'])
+    fit_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    y_pred = pipe.predict(prepared['X_test'])
+    predict_seconds = time.perf_counter() - start
+    return pipe, {
+        'params': params,
+        'fit_seconds': fit_seconds,
+        'predict_seconds': predict_seconds,
+        'accuracy': accuracy_score(prepared['y_test'], y_pred),
+        'f1_macro': f1_score(prepared['y_test'], y_pred, average='macro'),
+    }
+
+
+def _best_cv_index(cv_results):
+    # best cross-validated macro F1; ties go to the cheaper fit
+    scores = cv_results['mean_test_score']
+    return int(min(range(len(scores)), key=lambda i: (-scores[i], cv_results['mean_fit_time'][i])))
+
+
+def search(prepared, n_jobs=-1):
+    """Cross-validate every SEARCH_GRID candidate on the training split (candidates and folds in parallel, one
+    single-threaded forest per worker); returns (best candidate refitted on the training split, results)."""
+    grid = GridSearchCV(build_pipeline(n_jobs=1), {f'rf__{k}': v for k, v in SEARCH_GRID.items()},
+                        scoring='f1_macro', cv=StratifiedKFold(CV_FOLDS, shuffle=True, random_state=42),
+                        n_jobs=n_jobs, refit=_best_cv_index)
+    grid.fit(prepared['X_train'], prepared['y_train'])
+    cv = grid.cv_results_
+    results = [{'params': {k[len('rf__'):]: v for k, v in params.items()},
+                'fit_seconds': float(cv['mean_fit_time'][i]),
+                'cv_f1_macro': float(cv['mean_test_score'][i]),
+                'cv_f1_std': float(cv['std_test_score'][i])}
+               for i, params in enumerate(cv['params'])]
+    print(f"{'n_estimators':>12} {'max_depth':>9} {'max_features':>12} {'fit s':>7} {'cv f1':>7} {'± std':>6}")
+    for r in sorted(results, key=lambda r: -r['cv_f1_macro']):
+        p = r['params']
+        print(f"{p['n_estimators']:>12} {str(p['max_depth']):>9} {str(p['max_features']):>12} "
+              f"{r['fit_seconds']:>7.2f} {r['cv_f1_macro']:>7.4f} {r['cv_f1_std']:>6.4f}")
+    print('Best by cross-validated F1:', results[grid.best_index_]['params'])
+    return grid.best_estimator_, results
+
+
+def model_params(pipe):
+    """The DEFAULT_PARAMS keys of a fitted pipeline's forest."""
+    return {k: v for k, v in pipe.named_steps['rf'].get_params().items() if k in DEFAULT_PARAMS}
+
+
+def validation_split(prepared):
+    """A prepared dict whose train/test parts are a split of the training split only (for comparing variants)."""
+    X_fit, X_val, y_fit, y_val = train_test_split(
+        prepared['X_train'], prepared['y_train'], test_size=VALIDATION_SIZE,
+        random_state=PREPARE_SETTINGS['random_state'], stratify=prepared['y_train'])
+    return dict(prepared, X_train=X_fit, y_train=y_fit, X_test=X_val, y_test=y_val)
+
+
+def truncate_forest(pipe, n_trees):
+    """Copy of a fitted scaler + forest pipeline keeping only its first `n_trees` trees (no refit)."""
+    small = copy.deepcopy(pipe)
+    rf = small.named_steps['rf']
+    rf.estimators_ = rf.estimators_[:n_trees]
+    rf.n_estimators = len(rf.estimators_)
+    return small
+
+
+def distill_tree(pipe, prepared, max_depth=8, copies=20, noise=0.1):
+    """Single decision tree trained to mimic the forest: the training rows plus `copies` jittered copies
+    (Gaussian noise of `noise` standard deviations in scaled space), all labelled by the forest."""
+    scaler = pipe.named_steps['scaler']
+    X_scaled = scaler.transform(prepared['X_train'])
+    rng = np.random.default_rng(42)
+    X_aug = np.vstack([X_scaled] + [X_scaled + rng.normal(0, noise, X_scaled.shape) for _ in range(copies)])
+    y_aug = pipe.named_steps['rf'].predict(X_aug)
+    student = DecisionTreeClassifier(max_depth=max_depth, random_state=42).fit(X_aug, y_aug)
+    # reuse the fitted scaler so the result is a normal scaler + estimator pipeline (app.py's fast path)
+    return Pipeline([('scaler', scaler), ('rf', student)])
+
+
+def compaction_candidates(n_trees, n_jobs=-1):
+    """(name, build) pairs: build(pipe, prepared) makes the variant of a model fitted on prepared['X_train'] -- the
+    model itself, truncated forests, depth-capped refits and a distilled tree."""
+    candidates = [('base', lambda pipe, prepared: pipe)]
+    for k in (100, 50, 25, 10):
+        if k < n_trees:
+            candidates.append((f'first_{k}_trees', lambda pipe, prepared, k=k: truncate_forest(pipe, k)))
+    for n_estimators, max_depth in ((50, 8), (25, 6), (10, 4)):
+        params = dict(DEFAULT_PARAMS, n_estimators=n_estimators, max_depth=max_depth)
+        candidates.append((f'refit_{n_estimators}_trees_depth_{max_depth}',
+                           lambda pipe, prepared, params=params: fit_and_score(params, prepared, n_jobs)[0]))
+    for max_depth in (8, 5):
+        candidates.append((f'distilled_tree_depth_{max_depth}',
+                           lambda pipe, prepared, max_depth=max_depth: distill_tree(pipe, prepared, max_depth=max_depth)))
+    return candidates
+
+
+def _single_threaded(pipe):
+    if hasattr(pipe.named_steps['rf'], 'n_jobs'):
+        pipe.named_steps['rf'].n_jobs = None
+    return pipe
+
+
+def measure_candidate(name, pipe, prepared, base_scores, compress=3, latency_rows=300, load_repeat=3):
+    """Size/load time of the compressed artifact, single-row latency as app.py's fast path runs it, and scores (with
+    deltas to base_scores) on prepared['X_test'] -- compact() passes the validation split there."""
+    bundle = {'pipeline': pipe, 'label_map': prepared['label_map'], 'feature_names': prepared['feature_names']}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'model.pkl')
+        joblib.dump(bundle, path, compress=compress)
+        size_bytes = os.path.getsize(path)
+        load_seconds = []
+        for _ in range(load_repeat):
+            start = time.perf_counter()
+            joblib.load(path)
+            load_seconds.append(time.perf_counter() - start)
+
+    # scaler arithmetic + estimator.predict on one row at a time, like app.predict_matrix
+    scaler, estimator = pipe.named_steps['scaler'], pipe.named_steps['rf']
+    X_test = prepared['X_test'].to_numpy(dtype=np.float64)
+    rows = [X_test[i % len(X_test)][None, :] for i in range(latency_rows)]
+    estimator.predict((rows[0] - scaler.mean_) / scaler.scale_)  # warm-up
+    latencies = []
+    for row in rows:
+        start = time.perf_counter()
+        estimator.predict((row - scaler.mean_) / scaler.scale_)
+        latencies.append(time.perf_counter() - start)
+
+    y_pred = pipe.predict(prepared['X_test'])
+    accuracy = accuracy_score(prepared['y_test'], y_pred)
+    f1_macro = f1_score(prepared['y_test'], y_pred, average='macro')
+    base_accuracy, base_f1 = base_scores or (accuracy, f1_macro)
+    return {
+        'name': name,
+        'n_trees': len(getattr(estimator, 'estimators_', [estimator])),
+        'max_depth': max(getattr(t, 'get_depth')() for t in getattr(estimator, 'estimators_', [estimator])),
+        'size_bytes': size_bytes,
+        'load_seconds': min(load_seconds),
+        'latency_p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'latency_p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'accuracy': accuracy,
+        'f1_macro': f1_macro,
+        'accuracy_delta': accuracy - base_accuracy,
+        'f1_delta': f1_macro - base_f1,
+    }
+
+
+def compact(pipe, prepared, latency_budget_ms=None, compress=3, n_jobs=-1):
+    """Measure every compaction candidate; returns (chosen pipeline, report dict).
+    Candidates are built from a copy of the model refitted without a validation split of the training data and are
+    scored on that split. With a budget, the chosen one has the best validation F1 among candidates whose p99 fits
+    (ties: lower p99); if none fits, the fastest candidate is chosen. The choice is then rebuilt from the full model.
+    Without a budget the trained model is kept."""
+    val_prepared = validation_split(prepared)
+    val_base = _single_threaded(fit_and_score(model_params(pipe), val_prepared, n_jobs)[0])
+    candidates = compaction_candidates(len(pipe.named_steps['rf'].estimators_), n_jobs)
+    results = []
+    base_scores = None
+    for name, build in candidates:
+        candidate = _single_threaded(build(val_base, val_prepared))
+        results.append(measure_candidate(name, candidate, val_prepared, base_scores, compress=compress))
+        if base_scores is None:
+            base_scores = (results[0]['accuracy'], results[0]['f1_macro'])
+
+    print(f"{'candidate':<28} {'trees':>5} {'depth':>5} {'size KB':>8} {'load ms':>8} {'p50 ms':>7} {'p99 ms':>7} {'acc d':>7} {'f1 d':>7}  (validation)")
+    for r in results:
+        print(f"{r['name']:<28} {r['n_trees']:>5} {r['max_depth']:>5} {r['size_bytes'] / 1024:>8.1f} "
+              f"{r['load_seconds'] * 1000:>8.1f} {r['latency_p50_ms']:>7.3f} {r['latency_p99_ms']:>7.3f} "
+              f"{r['accuracy_delta']:>+7.4f} {r['f1_delta']:>+7.4f}")
+
+    chosen = 0
+    if latency_budget_ms is not None:
+        fits = [i for i, r in enumerate(results) if r['latency_p99_ms'] <= latency_budget_ms]
+        if fits:
+            chosen = min(fits, key=lambda i: (-results[i]['f1_macro'], results[i]['latency_p99_ms']))
+        else:
+            chosen = min(range(len(results)), key=lambda i: results[i]['latency_p99_ms'])
+            print(f'No candidate meets p99 <= {latency_budget_ms} ms; using the fastest one')
+    report = {
+        'latency_budget_ms': latency_budget_ms,
+        'compress': compress,
+        'scored_on': f'validation split ({VALIDATION_SIZE:.0%} of the training split)',
+        'chosen': results[chosen]['name'],
+        'candidates': results,
+    }
+    print('Chosen:', results[chosen]['name'])
+    return _single_threaded(candidates[chosen][1](pipe, prepared)), report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the priority model and save it to model.pkl.')
+    parser.add_argument('--n-jobs', type=int, default=-1, help='cores for fitting/search (-1 = all)')
+    parser.add_argument('--cache-dir', default='.train_cache', help='where the prepared split is cached')
+    parser.add_argument('--no-cache', action='store_true', help='always rebuild the prepared split')
+    parser.add_argument('--search', action='store_true', help='run the hyperparameter grid and keep the best model')
+    parser.add_argument('--compact', action='store_true', help='measure smaller variants of the model (see module docstring)')
+    parser.add_argument('--latency-budget-ms', type=float, default=None, help='with --compact: save the best variant whose p99 fits')
+    parser.add_argument('--compress', type=int, default=3, help='joblib compression level for --compact (0-9)')
+    parser.add_argument('--compact-report', default='compaction_report.json')
+    parser.add_argument('--export-flat', default=None, metavar='DIR',
+                        help='also export the saved model for flat_forest.py (checked against the pipeline on all rows)')
+    parser.add_argument('--output', default='model.pkl')
+    args = parser.parse_args()
+
+    total_start = time.perf_counter()
+    start = time.perf_counter()
+    prepared, cache_hit = prepare_data(None if args.no_cache else args.cache_dir)
+    print(f"Prepared data in {time.perf_counter() - start:.2f}s ({'cache hit' if cache_hit else 'rebuilt'})")
+
+    if args.search:
+        start = time.perf_counter()
+        pipe, results = search(prepared, args.n_jobs)
+        print(f'Search over {len(results)} candidates took {time.perf_counter() - start:.2f}s')
+    else:
+        pipe, result = fit_and_score(DEFAULT_PARAMS, prepared, args.n_jobs)
+        print(f"Fit in {result['fit_seconds']:.2f}s")
+
+    # the app scores one request at a time; a thread pool per predict call would only add latency
+    pipe.named_steps['rf'].n_jobs = None
+
+    if args.compact:
+        pipe, report = compact(pipe, prepared, args.latency_budget_ms, args.compress, args.n_jobs)
+        with open(args.compact_report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print('Wrote compaction report to', args.compact_report)
+
+    y_test = prepared['y_test']
+    y_pred = pipe.predict(prepared['X_test'])
     acc = accuracy_score(y_test, y_pred)
     f1_macro = f1_score(y_test, y_pred, average='macro')
 
-    print('Accuracy:', acc)
-    print('F1 (macro):', f1_macro)
+    print('Params:', model_params(pipe))
+    print('Test accuracy:', acc)
+    print('Test F1 (macro):', f1_macro)
     print('\nClassification report:')
     print(classification_report(y_test, y_pred, target_names=['low','medium','high']))
 
-    # save model and label map
-    joblib.dump({'pipeline': pipe, 'label_map': label_map}, 'model.pkl')
-    print('Saved model to model.pkl')
+    # save model, label map and the training feature order (used by app.py's NumPy fast path)
+    # write to a temp file and rename so a running app.py never reloads a half-written model.pkl
+    joblib.dump({'pipeline': pipe, 'label_map': prepared['label_map'], 'feature_names': prepared['feature_names']},
+                args.output + '.tmp', compress=args.compress if args.compact else 0)
+    os.replace(args.output + '.tmp', args.output)
+    print(f'Saved model to {args.output} (total {time.perf_counter() - total_start:.2f}s)')
+
+    if args.export_flat:
+        from flat_forest import export_flat_forest
+        X_all = pd.concat([prepared['X_train'], prepared['X_test']]).to_numpy(dtype=np.float64)
+        meta = export_flat_forest(args.output, args.export_flat, X_all)
+        print(f"Exported flat model ({meta['n_trees']} trees) for version {meta['model_version']} to {args.export_flat}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,105 @@
+"""
+user_store.py
+
+SQLite-backed store of hashed passwords for app.py, replacing the per-signup rewrite of users.json.
+
+Every gunicorn worker opens the same database file, so an account created in one worker is visible to the others on its
+next lookup. A signup is a single INSERT: the primary key on `username` makes the lookup an index probe and turns two
+concurrent signups for the same name into one success and one IntegrityError, instead of the last writer silently
+overwriting the other. The database runs in WAL mode, so readers (logins) never wait on a writer (signup).
+
+Connections are opened per thread and per process: sqlite3 connections must not be shared across threads or across a
+fork, and `preload_app` imports app.py in the gunicorn master.
+
+On first use the accounts in the legacy users.json are copied in once (existing rows win). The migration is recorded in
+the database, so later starts, and the other workers, skip it.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password_hash TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS migrations (
+    name TEXT PRIMARY KEY,
+    applied_at REAL NOT NULL,
+    rows INTEGER NOT NULL
+);
+"""
+
+# seconds a writer waits for another process's write lock before giving up
+BUSY_TIMEOUT = 10.0
+
+
+class UserStore:
+    def __init__(self, path='users.db', legacy_json_path=None):
+        self.path = path
+        self._local = threading.local()
+        conn = self._open()
+        try:
+            conn.executescript(SCHEMA)
+            if legacy_json_path:
+                self._migrate_json(conn, legacy_json_path)
+        finally:
+            # nothing stays open in the importing process; each worker/thread connects on first use
+            conn.close()
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=True)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # WAL + NORMAL: a commit is durable against process crashes, only an OS crash can lose the latest signups
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _conn(self):
+        local = self._local
+        pid = os.getpid()
+        if getattr(local, 'pid', None) != pid:
+            local.conn = self._open()
+            local.pid = pid
+        return local.conn
+
+    def _migrate_json(self, conn, json_path):
+        name = f'json:{os.path.basename(json_path)}'
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent starts run the migration once
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if conn.execute('SELECT 1 FROM migrations WHERE name = ?', (name,)).fetchone() is None:
+                users = {}
+                if os.path.exists(json_path):
+                    with open(json_path, 'r', encoding='utf-8') as f:
+                        users = json.load(f)
+                now = time.time()
+                conn.executemany('INSERT OR IGNORE INTO users (username, password_hash, created_at) VALUES (?, ?, ?)',
+                                 [(username, password_hash, now) for username, password_hash in users.items()])
+                conn.execute('INSERT INTO migrations (name, applied_at, rows) VALUES (?, ?, ?)', (name, now, len(users)))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def get_password_hash(self, username):
+        """Stored hash for `username`, or None if there is no such account."""
+        row = self._conn().execute('SELECT password_hash FROM users WHERE username = ?', (username,)).fetchone()
+        return row[0] if row else None
+
+    def exists(self, username):
+        return self._conn().execute('SELECT 1 FROM users WHERE username = ?', (username,)).fetchone() is not None
+
+    def add(self, username, password_hash):
+        """Create the account; False if the username is already taken (also when another worker just took it)."""
+        try:
+            self._conn().execute('INSERT INTO users (username, password_hash, created_at) VALUES (?, ?, ?)',
+                                 (username, password_hash, time.time()))
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def __len__(self):
+        return self._conn().execute('SELECT COUNT(*) FROM users').fetchone()[0]